@@ -3,14 +3,15 @@ __version__ = "6.0.0"
 
 import os
 import sys
-import yaml
 
-__import__('pkg_resources').declare_namespace(__name__)
+__path__ = __import__('pkgutil').extend_path(__path__, __name__)
 
 ABS_ROOT = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
 
 if not sys.path.count(ABS_ROOT):
     sys.path.append(ABS_ROOT)
 
-with open(os.path.join(ABS_ROOT, "config", "config.yml")) as conf:
-    CONFIG = yaml.safe_load(conf)
+from src.config import Config  # noqa: E402
+
+# read on first use, and swappable, e.g. for the benchmarks' config pointing at fake cafés and a fake Slack
+CONFIG = Config(os.environ.get("BENBOT_CONFIG", os.path.join(ABS_ROOT, "config", "config.yml")))
@@ -0,0 +1,140 @@
+from hashlib import blake2b
+import json
+import re
+from typing import AsyncIterable, Dict, Optional
+
+CHUNK_SIZE = 16 * 1024
+
+_MARKER = b"Bamco."
+_SCRIPT_END = b"</script>"
+# e.g. `Bamco.menu_items = {...};` or `Bamco.dayparts['1'] = {...};`
+_ASSIGNMENT = re.compile(rb"""Bamco\.(\w+)(?:\[['"]?(\w+)['"]?\])?\s*=\s*""")
+
+
+class BamcoPage:
+    """
+    The `Bamco.*` JSON assignments found on a café page, kept as raw bytes until they're decoded.
+    """
+    def __init__(self):
+        self.raw: Dict[str, bytes] = {}
+        self.raw_dayparts: Dict[str, bytes] = {}
+
+    @property
+    def menu_items(self) -> dict:
+        if "menu_items" not in self.raw:
+            raise LookupError
+        return json.loads(self.raw["menu_items"])
+
+    @property
+    def digest(self) -> str:
+        """
+        Hash of the raw `Bamco.menu_items`, so a page whose menu hasn't changed is spotted without decoding it.
+        """
+        if "menu_items" not in self.raw:
+            raise LookupError
+        return blake2b(self.raw["menu_items"], digest_size=16).hexdigest()
+
+    @property
+    def cor_icons(self) -> dict:
+        return json.loads(self.raw.get("cor_icons", b"{}"))
+
+    @property
+    def dayparts(self) -> Dict[str, dict]:
+        return {x: json.loads(y) for (x, y) in self.raw_dayparts.items()}
+
+    @property
+    def stations(self) -> Dict[str, dict]:
+        """
+        Stations of every daypart, keyed by station id.
+        """
+        return {x["id"]: x for daypart in self.dayparts.values() for x in daypart.get("stations", [])}
+
+
+class BamcoExtractor:
+    """
+    Incrementally scans a café page for its `Bamco.*` assignments, fed one chunk at a time. Only the assignment lines
+    are kept; everything else is discarded as it streams past, and the scan is done once the script block holding
+    `Bamco.menu_items` has been closed.
+    """
+    def __init__(self):
+        self.page = BamcoPage()
+        self.done = False
+        self._buffer = bytearray()
+        # how far into a partially received assignment line the search for its end has already got
+        self._scanned = 0
+
+    def feed(self, chunk: bytes) -> bool:
+        """
+        Scans the next chunk of the page.
+        :param chunk: the next bytes of the response body
+        :return: True once everything needed has been received, and the rest of the page can be skipped
+        """
+        buffer = self._buffer
+        buffer += chunk
+        pos = 0
+        while True:
+            start = buffer.find(_MARKER, pos)
+            if "menu_items" in self.page.raw:
+                end = buffer.find(_SCRIPT_END, pos, len(buffer) if start == -1 else start)
+                if end != -1:
+                    self.done = True
+                    buffer.clear()
+                    return True
+            if start == -1:
+                # keep enough of the tail that a marker split across chunks is still found
+                del buffer[:max(pos, len(buffer) - len(_SCRIPT_END))]
+                return False
+            eol = buffer.find(b"\n", max(start, self._scanned))
+            if eol == -1:
+                del buffer[:start]
+                self._scanned = len(buffer)
+                return False
+            self._assign(bytes(buffer[start:eol]))
+            self._scanned = 0
+            pos = eol + 1
+
+    def close(self) -> BamcoPage:
+        """
+        Flushes anything left at the end of the page.
+        """
+        if not self.done and self._buffer.startswith(_MARKER):
+            self._assign(bytes(self._buffer))
+        self._buffer.clear()
+        self.done = True
+        return self.page
+
+    def _assign(self, line: bytes) -> None:
+        if match := _ASSIGNMENT.match(line):
+            name, key = match.groups()
+            value = line[match.end():].rstrip()
+            value = value[:-1] if value.endswith(b";") else value
+            if name == b"dayparts" and key:
+                self.page.raw_dayparts[key.decode()] = value
+            elif not key:
+                self.page.raw.setdefault(name.decode(), value)
+
+
+async def extract(chunks: AsyncIterable[bytes]) -> BamcoPage:
+    """
+    Extracts the `Bamco.*` assignments from a streamed café page, without reading any more of it than necessary.
+    :param chunks: the response body, e.g. `response.content.iter_chunked(CHUNK_SIZE)`
+    """
+    extractor = BamcoExtractor()
+    async for chunk in chunks:
+        if extractor.feed(chunk):
+            break
+    return extractor.close()
+
+
+def extract_bytes(body: bytes, chunk_size: Optional[int] = None) -> BamcoPage:
+    """
+    Extracts the `Bamco.*` assignments from an already downloaded café page.
+    :param body: the page's bytes
+    :param chunk_size: feeds the page in chunks of this size, as it would be streamed, rather than all at once
+    """
+    extractor = BamcoExtractor()
+    step = chunk_size or len(body) or 1
+    for i in range(0, len(body), step):
+        if extractor.feed(body[i:i + step]):
+            break
+    return extractor.close()
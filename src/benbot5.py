@@ -6,18 +6,18 @@
 Slack bot that posts the lunch menu when called. This text should be expanded upon.
 """
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from dateutil import parser
-from functools import partial, reduce
+from functools import lru_cache, partial, reduce
 import logging
 import sqlite3
 import os
 from random import choice
 import re
 import sys
-from time import sleep
+from time import monotonic, sleep
 import traceback
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Tuple
 
 import calendar
 import pygsheets
@@ -30,19 +30,55 @@ with open(os.path.join(get_root(), 'config', 'config.yml')) as yml:
     CONFIG = yaml.safe_load(yml)
 SERVICE_ACCOUNT_FILE = os.path.join(get_root(), 'config', 'service_account.json')
 WEEK_DAYS = ('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY')
+WEEKDAY_PATTERN = re.compile(r'(MON|TUES|WEDNES|THURS|FRI)DAY')
+DIGIT_PATTERN = re.compile(r'\d')
+# e.g. 06/17 or 06/17/2019, parsed directly rather than with dateutil
+SHORT_DATE_PATTERN = re.compile(r'\s*(\d{1,2})/(\d{1,2})(?:/(\d{4}))?\s*')
+WORD_PATTERN = re.compile(r'[^\W\d_]+')
+DATE_BRACKETS = str.maketrans({x: None for x in "(){}<>"})
+DATE_INFO = parser.parserinfo()
 
 logging.basicConfig(stream=sys.stdout, format='%(name)s - %(levelname)s - %(message)s')
 
-sheets = pygsheets.authorize(service_account_file=SERVICE_ACCOUNT_FILE)
+MEAL_TYPES = ('lunch', 'dinner')
+SHEET_COLUMNS = 7
+# seconds between checks of the Sheet for new rows, made as menus are asked for
+SYNC_INTERVAL = 5 * 60
 
-# creates a new sqlite db in memory, creates tables for lunch and dinner with a set structure mirroring the Sheet
+# creates a new sqlite db in memory, creates tables for lunch and dinner with a set structure mirroring the Sheet.
+# (year, week) is the primary key, so looking up a week's menu is an index lookup rather than a table scan
 con = sqlite3.connect(":memory:", check_same_thread=False)
 con.isolation_level = None
 cursor = con.cursor()
-for table in ('lunch', 'dinner'):
-    cursor.execute(f'CREATE TABLE {table} (year, week, monday, tuesday, wednesday, thursday, friday)')
+for table in MEAL_TYPES:
+    cursor.execute(
+        f'CREATE TABLE {table} '
+        '(year INTEGER, week INTEGER, monday, tuesday, wednesday, thursday, friday, PRIMARY KEY (year, week))'
+    )
 con.commit()
 
+# how many rows of each worksheet are in the local db, when the Sheet had last been modified as of the last sync, and
+# when (by the monotonic clock) the Sheet was last checked
+synced_rows = {x: 0 for x in MEAL_TYPES}
+sync_state = {'updated': None, 'checked': float('-inf')}
+
+
+@lru_cache(maxsize=None)
+def spreadsheet():
+    """
+    The Google Sheet holding the menus, authorized and opened on first use, then reused.
+    """
+    return pygsheets.authorize(service_account_file=SERVICE_ACCOUNT_FILE).open_by_key(CONFIG['sheet_key'])
+
+
+@lru_cache(maxsize=None)
+def worksheet(meal_type: str):
+    """
+    The worksheet for the meal type, looked up on first use, then reused.
+    :param meal_type: 'lunch' or 'dinner'
+    """
+    return spreadsheet().worksheet_by_title(meal_type)
+
 
 def inticize(string: str) -> int:
     """
@@ -57,31 +93,95 @@ def inticize(string: str) -> int:
     return output
 
 
-def sync_db(**_):
-    for table_name in ('lunch', 'dinner'):
-        cursor.execute(f'DROP TABLE {table_name}')
-        cursor.execute(f'CREATE TABLE {table_name} (year, week, monday, tuesday, wednesday, thursday, friday)')
-        con.commit()
-        wks = sheets.open_by_key(CONFIG['sheet_key']).worksheet_by_title(table_name)
-        values = wks.get_all_values(include_tailing_empty=False, include_tailing_empty_rows=False)
-        formatted_values = map(lambda x: (inticize(x[0]), inticize(x[1]), x[2], x[3], x[4], x[5], x[6]), values)
-        cursor.executemany(f'INSERT INTO {table_name} VALUES (?, ?, ?, ?, ?, ?, ?)', formatted_values)
-        con.commit()
-    logging.info('db sync')
+def format_row(row: list) -> tuple:
+    """
+    Converts a row of the Sheet to a row of the local db. Trailing empty cells aren't returned by the Sheet, so the
+    row is padded back out to the full width.
+    :param row: (year, week, monday, tuesday, wednesday, thursday, friday)
+    """
+    padded = (list(row) + [''] * SHEET_COLUMNS)[:SHEET_COLUMNS]
+    return (inticize(padded[0]), inticize(padded[1]), *padded[2:])
+
+
+def store_rows(meal_type: str, rows) -> None:
+    """
+    Writes rows of the Sheet to the local db. A later row for the same week replaces an earlier one, so a re-added
+    menu takes the place of the one it corrects.
+    :param meal_type: 'lunch' or 'dinner'
+    :param rows: rows as returned by the Sheet
+    """
+    cursor.executemany(f'INSERT OR REPLACE INTO {meal_type} VALUES (?, ?, ?, ?, ?, ?, ?)', map(format_row, rows))
+    con.commit()
+
+
+def sync_db(full: bool = False, **_):
+    """
+    Brings the local db up to date with the Sheet. Unless a full sync is asked for, nothing is fetched if the Sheet
+    hasn't been modified since the last sync, and otherwise only the rows appended since then are fetched; rows edited
+    in place are picked up by a full sync (on startup, or with 'sync-db full').
+    :param full: reload every row of the Sheet
+    """
+    updated = spreadsheet().updated
+    sync_state['checked'] = monotonic()
+    if not full and updated == sync_state['updated']:
+        logging.info('db sync skipped, sheet unchanged')
+        return
+    for table_name in MEAL_TYPES:
+        wks = worksheet(table_name)
+        if full:
+            values = wks.get_all_values(include_tailing_empty=False, include_tailing_empty_rows=False)
+            cursor.execute(f'DELETE FROM {table_name}')
+            synced_rows[table_name] = 0
+        else:
+            # the range needs an end row, without one pygsheets asks for the whole columns; the worksheet is cached,
+            # so its row count is refreshed to take in rows appended since
+            wks.refresh()
+            values = wks.get_values(
+                (synced_rows[table_name] + 1, 1),
+                (wks.rows, SHEET_COLUMNS),
+                include_tailing_empty=False,
+                include_tailing_empty_rows=False
+            ) if synced_rows[table_name] < wks.rows else []
+        store_rows(table_name, values)
+        synced_rows[table_name] += len(values)
+    sync_state['updated'] = updated
+    logging.info(f'db sync ({"full" if full else "incremental"})')
+
+
+def sync_if_due() -> None:
+    """
+    Incrementally syncs the db if the Sheet hasn't been checked for SYNC_INTERVAL seconds, so that menus added to the
+    Sheet by hand show up without a 'sync-db'. A failed sync is logged, leaving the db as it was.
+    """
+    if monotonic() - sync_state['checked'] < SYNC_INTERVAL:
+        return
+    try:
+        sync_db()
+    except Exception as e:
+        logging.warning(f'db sync failed: {e!r}')
+
+
+def sync_command(text: str, **_) -> None:
+    """
+    'sync-db' brings in the rows appended to the Sheet since the last sync, and 'sync-db full' reloads every row.
+    :param text: The message text
+    """
+    sync_db(full='FULL' in text.upper().split())
 
 
 def append_menu_to_g_sheet(menu: list, meal_type: str, week_number: int, year_number: int) -> None:
     """
-    Appends the menu list to the Google Sheet, and then syncs the local sqlite db with the new info
+    Appends the menu list to the Google Sheet, and writes the same row straight into the local sqlite db
     :param menu: List of the menu by the days, Monday - Friday
     :param meal_type: 'lunch' or 'dinner'
     :param week_number: number for the week of the year
     :param year_number: four-digit int of year number (e.g. 2019, 2020)
     """
-    wks = sheets.open_by_key(CONFIG['sheet_key']).worksheet_by_title(meal_type)
     values = [year_number, week_number] + menu
-    wks.append_table(values)
-    sync_db()
+    worksheet(meal_type).append_table(values)
+    # the row isn't counted as synced, as others may have been appended to the Sheet ahead of it; the next sync reads
+    # it back along with them, which is harmless as it replaces itself
+    store_rows(meal_type, [values])
 
 
 def route(text: str):
@@ -95,7 +195,7 @@ def route(text: str):
         'add-dinner': partial(add_meal, meal_type='dinner'),
         'lunch': partial(post_meal, meal_type='lunch'),
         'dinner': partial(post_meal, meal_type='dinner'),
-        'sync-db': sync_db
+        'sync-db': sync_command
     }
     dict_match = reduce(lambda x, y: y if y in routing_dict else x, reversed(text.split(" ")), "")
     if dict_match:
@@ -129,25 +229,88 @@ def listen_for_lunch(**message):
         return
 
 
+def has_numeric(line: str) -> bool:
+    """
+    Whether the line has any numeric characters, such as digits or fractions like ½.
+    """
+    return bool(DIGIT_PATTERN.search(line)) or (not line.isascii() and any(x.isnumeric() for x in line))
+
+
+def could_be_date_word(word: str) -> bool:
+    """
+    Whether dateutil could make sense of the word in a date, without fuzzy parsing. A line with any other word in it
+    would fail to parse, so isn't worth handing to dateutil.
+    """
+    return bool(
+        DATE_INFO.jump(word) or DATE_INFO.pertain(word) or DATE_INFO.utczone(word)
+        or DATE_INFO.weekday(word) is not None
+        or DATE_INFO.month(word) is not None
+        or DATE_INFO.hms(word) is not None
+        or DATE_INFO.ampm(word) is not None
+        # possibly a time zone name
+        or (len(word) <= 5 and word.isascii() and word.isupper())
+    )
+
+
+@lru_cache(maxsize=4096)
+def parse_date(line: str, today: date) -> Optional[datetime]:
+    """
+    Attempts to extract a date from a line of a menu. Lines are cached with the day they were parsed on, as missing
+    parts of a date default to today's.
+    :param line: a line of the menu
+    :param today: the current date
+    :return: the date, or None if the line isn't one
+    """
+    to_parse = line.translate(DATE_BRACKETS)
+    if (match := SHORT_DATE_PATTERN.fullmatch(to_parse)) and int(match.group(1)) <= 12:
+        month, day, year = match.groups()
+        try:
+            return datetime(int(year) if year else today.year, int(month), int(day))
+        except ValueError:
+            return None
+    if not all(could_be_date_word(x) for x in WORD_PATTERN.findall(to_parse)):
+        return None
+    try:
+        return parser.parse(to_parse)
+    except (ValueError, OverflowError):
+        return None
+
+
 def parse_lines_for_dates(text_list: List[str]) -> List[datetime]:
     """
     Parses the a list of strings, attempting to extract dates from them.
     :param text_list: List of strings, typically the splitlines of a week's lunch/dinner menu
     :return: List of datetime objects pulled from the list of strings
     """
-    translation_table = str.maketrans({x: None for x in "(){}<>"})
+    today = datetime.now().date()
+    dates = {parse_date(x, today): None for x in text_list if has_numeric(x)}
+    return [x for x in dates if x]
 
-    def parse_with_none(string):
-        try:
-            to_parse = string.translate(translation_table)
-            output = parser.parse(to_parse)
-        except ValueError:
-            output = None
-        return output
 
-    numerics = filter(lambda x: any(y.isnumeric() for y in x), text_list)
-    dates = {parse_with_none(x) for x in numerics}
-    return [x for x in dates if x]
+def scan_meal(lines: Iterable[str], find_dates: bool = True) -> Tuple[Dict[str, str], List[datetime]]:
+    """
+    Splits a menu into its days and extracts its dates in a single pass over its lines. Empty lines are skipped, and
+    lines before the first weekday belong to Monday.
+    :param lines: the lines of a week's lunch/dinner menu
+    :param find_dates: whether to extract the dates
+    :return: ({day_name:day_menu}, [datetime objects of extracted dates])
+    """
+    sections = {x: [] for x in WEEK_DAYS}
+    dates = {}
+    today = datetime.now().date()
+    day = 'MONDAY'
+    for line in lines:
+        line = line.rstrip()
+        if not line:
+            continue
+        if find_dates and has_numeric(line) and (parsed := parse_date(line, today)) is not None:
+            dates[parsed] = None
+        if match := WEEKDAY_PATTERN.search(line.upper()):
+            day = match.group()
+            sections[day] = [f"*{day}*\n"]
+        else:
+            sections[day].append(f"{line}\n")
+    return {x: "".join(y) for (x, y) in sections.items()}, list(dates)
 
 
 def parse_meal(meal_text: str) -> Tuple[dict, List[datetime]]:
@@ -156,10 +319,7 @@ def parse_meal(meal_text: str) -> Tuple[dict, List[datetime]]:
     :param meal_text: The raw text from a weekly lunch/dinner menu
     :return: ({day_name:day_menu}, [datetime objects of extracted dates])
     """
-    processed_text = strip_extra_newlines(meal_text)
-    dates = parse_lines_for_dates(processed_text)
-    meal_dict = parse_text_for_all_weekdays(processed_text)
-    return meal_dict, dates
+    return scan_meal(meal_text.splitlines())
 
 
 def parse_for_day(meal_text: str, day: str) -> str:
@@ -190,17 +350,7 @@ def parse_text_for_all_weekdays(text_list: List[str]) -> dict:
     :param text_list: Week menu splitlines, should not include empty items.
     :return:
     """
-    def line_reduction(x: tuple, y: str):
-        upper_y = y.upper()
-        if any(z in upper_y for z in WEEK_DAYS):
-            tracking_day = re.search(r'(MON|TUES|WEDNES|THURS|FRI)DAY', upper_y).group()
-            update = {tracking_day: f"*{tracking_day}*\n"}
-        else:
-            tracking_day = x[0] or "MONDAY"
-            update = {tracking_day: x[1].get(tracking_day) + y + "\n"}
-        return tracking_day, {**x[1], **update}
-
-    return reduce(line_reduction, text_list, ('', {z: "" for z in WEEK_DAYS}))[1]
+    return scan_meal(text_list, find_dates=False)[0]
 
 
 def strip_extra_newlines(text: str) -> List[str]:
@@ -232,6 +382,7 @@ def parse_message_for_day(text: str) -> str:
 
 
 def post_meal(meal_type: str, channel: str, text: str, web_client: WebClient) -> None:
+    sync_if_due()
     date_dict = {**{"WEEK": '*'}, **{x: x.lower() for x in WEEK_DAYS}}
     when = parse_message_for_day(text)
     year, week, _ = datetime.now().isocalendar()
@@ -291,7 +442,7 @@ def start_slack():
 
 def main():
     try:
-        sync_db()
+        sync_db(full=True)
         start_slack()
     except KeyboardInterrupt:
         sys.exit()
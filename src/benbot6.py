@@ -1,52 +1,280 @@
 import asyncio
-from datetime import datetime, timedelta, date, timezone
+from datetime import date
+from functools import partial
 import json
 import logging
 from random import choice
 import sys
-from typing import Optional, Tuple, List
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
 
-from slack_sdk import WebClient
-from quart import Quart, request
+from cachetools import TTLCache
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+from quart import Quart, Response, request
 
 from src import CONFIG
+from src.blocks import menu_messages
+from src.breaker import CircuitBreaker, CircuitOpenError
+from src.config import ConfigWatcher
+from src.digest import Digester
+from src.events import EventDeduplicator, peek_event_id
+from src.fanout import fan_out
 from src.get_menu import Cafe
-
-WEEK_DAYS = ('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY')
-MEAL_TYPES = ("LUNCH", "DINNER")
+from src.menu_cache import MenuCache
+from src.menu_store import MenuStore
+from src.metrics import METRICS
+from src.prefetch import Prefetcher
+from src.render import DIETARY_FILTERS, icons_text
+from src.router import SUBSCRIPTION_ACTIONS, Command, Router, week_dates
+from src.search import MenuIndex
+from src.session import SessionPool
+from src.singleflight import SingleFlight
+from src.slack_queue import SlackPoster
+from src.supervisor import Job, TaskSupervisor
 
 logging.basicConfig(stream=sys.stdout, format='%(name)s - %(levelname)s - %(message)s')
 
 app = Quart(__name__)
-web_client = WebClient(CONFIG["tokens"]["slack_token"])
-cafes = {
-    x: Cafe(y["company"], y["name"]) for (x, y) in CONFIG["cafes"].items()
-}
+# the bot's components are built by `build` once the app starts, rather than on import, so that importing the app
+# doesn't read the config; the Slack client and cafés are built by `configure`, which rebuilds them whenever the config
+# is reloaded
+web_client: Optional[AsyncWebClient] = None
+slack: Optional[SlackPoster] = None
+http_pool: Optional[SessionPool] = None
+menu_cache: Optional[MenuCache] = None
+menu_flights = SingleFlight()
+menu_store: Optional[MenuStore] = None
+cafes: Dict[str, Cafe] = {}
+# the settings each café was built from, so a reload only rebuilds the cafés whose settings changed
+cafe_settings: Dict[str, dict] = {}
+# every menu the bot fetches is indexed, so dishes can be searched for across cafés and days
+menu_index: Optional[MenuIndex] = None
+prefetcher: Optional[Prefetcher] = None
+# pushes each café's menu to the channels subscribed to it, once a day
+digester: Optional[Digester] = None
+# the times particular cafés' digests are posted at, from their digest_time setting
+digest_times: Dict[str, str] = {}
+router: Optional[Router] = None
+config_watcher: Optional[ConfigWatcher] = None
+seen_events: Optional[EventDeduplicator] = None
+supervisor: Optional[TaskSupervisor] = None
+# channels recently told the bot is busy, so a saturated bot doesn't add to its load with a reply to every mention
+busy_notices = TTLCache(maxsize=1000, ttl=60)
+busy_tasks = set()
+# errors from Slack meaning a Block Kit message couldn't be posted, but the same content could be as plain text
+BLOCK_ERRORS = {"invalid_blocks", "invalid_blocks_format", "msg_too_long"}
+
+MENTIONS = METRICS.counter("benbot_mentions_total", "Mentions received, by what they asked for", ("action",))
+MENTION_SECONDS = METRICS.histogram("benbot_mention_seconds", "Time spent acknowledging a mention")
+POST_MEAL_SECONDS = METRICS.histogram("benbot_post_meal_seconds", "Time spent getting and posting menus for a mention")
+METRICS.collect("benbot_menu_cache_hits_total", "Menu cache hits", "counter", lambda: menu_cache.hits)
+METRICS.collect("benbot_menu_cache_misses_total", "Menu cache misses", "counter", lambda: menu_cache.misses)
+METRICS.collect("benbot_menu_cache_size", "Menus cached", "gauge", lambda: len(menu_cache))
+METRICS.collect(
+    "benbot_menu_fetches_total", "Menu pages requested from each café's site", "counter",
+    lambda: {(x.cafe_name,): x.fetches for x in cafes.values()}, ("cafe",)
+)
+METRICS.collect(
+    "benbot_menu_not_modified_total", "Menu pages the café's site said were unchanged", "counter",
+    lambda: {(x.cafe_name,): x.not_modified for x in cafes.values()}, ("cafe",)
+)
+METRICS.collect(
+    "benbot_breaker_open", "Whether each café's circuit breaker is open (1), half open (0.5) or closed (0)", "gauge",
+    lambda: {(x.cafe_name,): {"open": 1, "half_open": 0.5}.get(x.breaker.state, 0) for x in cafes.values()}, ("cafe",)
+)
+METRICS.collect(
+    "benbot_digest_posts_total", "Digests posted to subscribed channels", "counter",
+    lambda: digester.posted if digester is not None else 0
+)
+METRICS.collect("benbot_tasks_queued", "Handlers waiting to run", "gauge", lambda: supervisor.stats()["queued"])
+METRICS.collect("benbot_slack_queued", "Slack API calls waiting to be sent", "gauge", lambda: slack.stats()["queued"])
+
+
+async def configure(config: Mapping) -> None:
+    """
+    Builds the Slack client and cafés from the config, or rebuilds those whose settings have changed since it was last
+    called. Cafés that are unchanged are kept as they are, as are the cached menus of those whose site is unchanged,
+    while the cached and indexed menus of cafés that have been removed are dropped.
+    :param config: the bot's config
+    """
+    global web_client, router
+    # one shared session keeps connections to Slack and the cafés' sites alive between requests, rather than a
+    # connection pool per café and a new handshake per Slack message
+    session = await http_pool.open()
+    slack_settings = (config["tokens"]["slack_token"], config.get("slack_base_url", AsyncWebClient.BASE_URL))
+    if web_client is None or (web_client.token, web_client.base_url) != slack_settings:
+        web_client = slack.client = AsyncWebClient(*slack_settings, session=session)
+    upstream = dict(config.get("upstream", {}))
+    breaker_config = upstream.pop("breaker", {})
+    settings = {x: {**y, "upstream": config.get("upstream", {})} for (x, y) in config["cafes"].items()}
+    built = {}
+    for (nickname, setting) in settings.items():
+        if cafe_settings.get(nickname) != setting:
+            built[nickname] = Cafe(
+                setting["company"], setting["name"], setting["utc_offset"], menu_cache, menu_flights, menu_store,
+                breaker=CircuitBreaker(**breaker_config), base_url=setting.get("base_url"), **upstream
+            )
+            await built[nickname].initialize_session(session)
+    replaced = {x: y for (x, y) in cafes.items() if x not in settings or x in built}
+    # swapped in without yielding to the event loop, so mentions are only ever routed to cafés that exist
+    for nickname in replaced:
+        del cafes[nickname]
+    cafes.update(built)
+    cafe_settings.clear()
+    cafe_settings.update(settings)
+    router = Router(config["cafes"], config.get("cafe_groups"))
+    menu_index.names.clear()
+    menu_index.names.update({y.base_url: x for (x, y) in cafes.items()})
+    digest_times.clear()
+    digest_times.update({x: y["digest_time"] for (x, y) in config["cafes"].items() if y.get("digest_time")})
+    for (nickname, cafe) in replaced.items():
+        if cafe.base_url not in menu_index.names:
+            menu_cache.drop(cafe.base_url)
+            menu_index.drop(nickname)
+        await cafe.close_session()
+    if built or replaced:
+        removed = [x for x in replaced if x not in built]
+        logging.info(f"cafés (re)built: {', '.join(built) or 'none'}, removed: {', '.join(removed) or 'none'}")
+
+
+async def reconfigure(_previous: Mapping, config: Mapping) -> None:
+    """
+    Applies a reloaded config.
+    """
+    await configure(config)
+    await prefetcher.sync()
+    if digester is not None:
+        await digester.sync()
+
+
+async def post_as_flavorbot(channel: str, text: str, **kwargs):
+    """
+    Posts a message as Flavorbot, with one of Guy Fieri's pictures as its icon.
+    :param channel: the Slack channel ID to post in
+    :param text: the message text
+    :param kwargs: any other chat.postMessage arguments, such as blocks or thread_ts
+    """
+    return await slack.post_message(
+        channel=channel,
+        text=text,
+        icon_url=choice(CONFIG['guy_fieri_images']),
+        username='Flavorbot',
+        **kwargs
+    )
+
+
+async def digest_message(channel: str, text: str, blocks: List[dict]):
+    return await post_as_flavorbot(channel, text, blocks=blocks)
+
+
+def build() -> None:
+    """
+    Builds the bot's components from the config, ahead of `configure` building the Slack client and cafés.
+    """
+    global slack, http_pool, menu_cache, menu_store, menu_index, prefetcher, digester
+    global config_watcher, seen_events, supervisor
+    METRICS.configure(**CONFIG.get("metrics", {}))
+    slack = SlackPoster(None, **CONFIG.get("slack_queue", {}))
+    http_pool = SessionPool(**CONFIG.get("http", {}))
+    menu_cache = MenuCache(**CONFIG.get("menu_cache", {}))
+    menu_store = MenuStore(**CONFIG["menu_store"]) if CONFIG.get("menu_store") else None
+    menu_index = MenuIndex({}, **CONFIG.get("menu_index", {}))
+    menu_cache.listeners.append(menu_index.update)
+    prefetcher = Prefetcher(cafes, **CONFIG.get("prefetch", {}))
+    digester = Digester(cafes, digest_message, menu_store, run_times=digest_times, **CONFIG["digest"]) \
+        if CONFIG.get("digest") else None
+    config_watcher = ConfigWatcher(CONFIG, **CONFIG["config_watch"]) if CONFIG.get("config_watch") else None
+    if config_watcher is not None:
+        config_watcher.listeners.append(reconfigure)
+    seen_events = EventDeduplicator(store=menu_store, **CONFIG.get("event_dedup", {}))
+    supervisor = TaskSupervisor(**CONFIG.get("supervisor", {}))
 
 
 @app.route("/mention", methods=["POST"])
 async def mentioned():
-    data = json.loads(await request.data)
+    started = time.perf_counter()
+    try:
+        return await handle_mention()
+    finally:
+        MENTION_SECONDS.observe(time.perf_counter() - started)
+
+
+async def handle_mention():
+    body = await request.get_data()
+    # Slack retries events it thinks weren't acknowledged in time; those that have already been handled are
+    # acknowledged straight away, before decoding any of the payload
+    retry_num = request.headers.get("X-Slack-Retry-Num")
+    if not await seen_events.first_delivery(peek_event_id(body), retry_num):
+        logging.info(f"ignoring retry {retry_num} ({request.headers.get('X-Slack-Retry-Reason')}) of handled event")
+        return "ok"
+    data = json.loads(body)
     event = data["event"]
     channel = event["channel"]
-    event_text = str(event["text"]).lower()
-    if "lunch" in event_text:
+    command = router.parse(str(event["text"]))
+    MENTIONS.labels(command.action or command.meal or "other").inc()
+    if command.action in SUBSCRIPTION_ACTIONS:
+        submit(channel, lambda: post_subscription(command, channel))
+    elif command.is_search:
+        submit(channel, lambda: post_search(command, channel))
+    elif command.meal == "lunch":
         # Slack requires a response within 3000ms, so this is done asynchronously while a response is sent immediately
         # to avoid multiple requests coming through for longer-running tasks (such as the full week's menu)
-        asyncio.create_task(post_meal("lunch", channel, event["text"]))
-    elif "help" in event_text:
-        asyncio.create_task(help_text(channel))
+        submit(channel, lambda: post_meal(command, channel, event["text"]))
+    elif command.action == "help":
+        submit(channel, lambda: help_text(channel))
     return "ok"
 
 
+def submit(channel: str, job: Job) -> None:
+    """
+    Hands a handler to the task supervisor, letting the channel know if the bot is too busy to take it on.
+    :param channel: the Slack channel ID that the message was posted in
+    :param job: coroutine function handling the message
+    """
+    if not supervisor.submit(channel, job) and channel not in busy_notices:
+        busy_notices[channel] = None
+        task = asyncio.create_task(busy_text(channel))
+        busy_tasks.add(task)
+        task.add_done_callback(busy_tasks.discard)
+
+
+@app.route("/stats", methods=["GET"])
+async def stats():
+    return {
+        "menu_cache": menu_cache.stats(),
+        "menu_fetches_in_flight": menu_flights.in_flight(),
+        "menus_indexed": len(menu_index),
+        "menu_fetches": {x: y.stats() for (x, y) in cafes.items()},
+        "http_pool": http_pool.stats(),
+        "events": seen_events.stats(),
+        "tasks": supervisor.stats(),
+        "slack": slack.stats(),
+        "config": config_watcher.stats() if config_watcher is not None else None,
+        "digest": digester.stats() if digester is not None else None,
+    }
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics():
+    return Response(METRICS.render(), content_type="text/plain; version=0.0.4")
+
+
 @app.before_serving
 async def preload():
     """
     Executed at app startup
     """
     # asyncio.create_task(catia.get_part_number("prd"))
-    for cafe in cafes.values():
-        await cafe.initialize_session()
+    build()
+    await configure(CONFIG)
+    slack.start()
+    supervisor.start()
+    prefetcher.start()
+    if digester is not None:
+        digester.start()
+    if config_watcher is not None:
+        config_watcher.start()
 
 
 @app.after_serving
@@ -54,8 +282,24 @@ async def shutdown():
     """
     Executed at app shutdown
     """
+    if config_watcher is not None:
+        await config_watcher.stop()
+    await supervisor.drain()
+    await slack.stop()
+    await prefetcher.stop()
+    if digester is not None:
+        await digester.stop()
     for cafe in cafes.values():
-        await cafe.req.close()
+        await cafe.close_session()
+    await http_pool.close()
+    if menu_store is not None:
+        await menu_store.close()
+
+
+async def busy_text(channel: str):
+    return await post_as_flavorbot(
+        channel, "I'm busy cooking up menus for everybody else, give me a minute and ask again."
+    )
 
 
 async def help_text(channel: str):
@@ -71,88 +315,111 @@ async def help_text(channel: str):
             "The following are valid cafes:",
             " - " + ", ".join(CONFIG["cafes"].keys()),
             "The following are valid days:",
-            " - Today, Tomorrow, Yesterday, Monday, Tuesday, Wednesday, Thursday, Friday, Week"
+            " - Today, Tomorrow, Yesterday, Monday, Tuesday, Wednesday, Thursday, Friday, Week",
+            "To only see vegan, vegetarian, or gluten-free items, add it to your message:",
+            "'@Benbot lunch vegan Friday'",
+            "To see every cafe's menu at once, you can type:",
+            "'@Benbot lunch all'",
+            "To find out where a dish is being served this week, or when it's next on the menu, you can type:",
+            "'@Benbot where is ramen' or '@Benbot when is gyro'",
+            "To have a cafe's menu posted to this channel every weekday, or to stop it, you can type:",
+            "'@Benbot subscribe hq' or '@Benbot unsubscribe hq'"
         ]
     )
-    return web_client.chat_postMessage(
-        channel=channel,
-        text=output,
-        icon_url=choice(CONFIG['guy_fieri_images']),
-        username='Flavorbot'
-    )
+    return await post_as_flavorbot(channel, output)
 
 
-def parse_message_for_day(text: str, utc_offset: int = 0) -> Optional[List[date]]:
+async def post_subscription(command: Command, channel: str) -> None:
     """
-    Attempts to determine the date for the meal requested, based on the Slack message. If no date can be determined,
-    today's date is returned.
-    :param text: the Slack message to parse
-    :param utc_offset: UTC offset for the time zone of the café in question
+    Subscribes the channel to, or unsubscribes it from, the daily digest of each café named in the message (or the
+    default café, if none are).
+    :param command: the parsed message
+    :param channel: the Slack channel ID that the message was posted in
     """
-    today = (datetime.now(timezone.utc) + timedelta(hours=utc_offset)).date()
-    if (week_day := today.weekday()) in {5, 6}:
-        week_start = today + timedelta(days=7-week_day)
+    post_message = partial(post_as_flavorbot, channel)
+
+    nicknames = [x for x in command.fan_out or (command.cafe,) if x in cafes]
+    if digester is None:
+        await post_message("Daily menus aren't turned on for me, ask whoever runs me to add a digest to my config.")
+    elif not (channel.startswith("D") or channel in CONFIG.get("whitelist_channels", ())):
+        await post_message("I can only post daily menus to whitelisted channels, or to you directly.")
+    elif command.action == "unsubscribe":
+        removed = await digester.unsubscribe(nicknames, channel)
+        await post_message(
+            f"I'll stop posting {', '.join(nicknames)}'s menu here." if removed else "This channel isn't subscribed."
+        )
     else:
-        week_start = today - timedelta(days=week_day)
-    day_mappings = {
-        'TODAY': [today],
-        'TOMORROW': [today + timedelta(days=1)],
-        'YESTERDAY': [today - timedelta(days=1)],
-        'MONDAY': [week_start],
-        'TUESDAY': [week_start + timedelta(days=1)],
-        'WEDNESDAY': [week_start + timedelta(days=2)],
-        'THURSDAY': [week_start + timedelta(days=3)],
-        'FRIDAY': [week_start + timedelta(days=4)],
-        'WEEK': [
-            week_start,
-            week_start+timedelta(days=1),
-            week_start + timedelta(days=2),
-            week_start + timedelta(days=3),
-            week_start + timedelta(days=4),
-        ]
-    }
-    upper_text = text.upper()
-    if any(upper_text.split()[-1] == x for x in MEAL_TYPES):
-        return [today]
-    for day, date_ in day_mappings.items():
-        if day in upper_text:
-            return date_
+        added = [x for x in nicknames if await digester.subscribe(x, channel)]
+        await post_message("\n".join(
+            f"I'll post {x}'s menu here at {digester.run_time_for(x).strftime('%H:%M')} "
+            f"(UTC{cafes[x].utc_offset:+d}) every weekday." for x in added
+        ) or "This channel is already subscribed.")
 
 
-def get_cafe(text) -> Tuple[Cafe, int]:
+async def post_search(command: Command, channel: str) -> None:
     """
-    Determines the café to post from, based on the message. Returns the default café if the message doesn't contain
-    a café nickname (as specified in the config.yml file)
-    :param text: the message posted to Slack requesting the message
+    Searches the menus the bot has seen for a dish, and posts where and when it's being served.
+    :param command: the parsed message, with the dish to search for as its query
+    :param channel: the Slack channel ID that the message was posted in
     """
-    u_text = text.upper()
-    for (cafe_name, cafe_) in cafes.items():
-        if cafe_name.upper() in u_text:
-            return cafe_, CONFIG["cafes"][cafe_name]["utc_offset"]
+    post_message = partial(post_as_flavorbot, channel)
+
+    if not command.query:
+        await post_message("What am I looking for? Try '@Benbot where is ramen' or '@Benbot when is gyro'")
+        return
+    today = cafes[command.cafe].today()
+    codes = DIETARY_FILTERS[command.dietary] if command.dietary else ()
+    if command.action == "when":
+        hits = menu_index.next(command.query, today.strftime("%Y-%m-%d"), codes)
     else:
-        return cafes["default"], CONFIG["cafes"]["default"]["utc_offset"]
+        dates = command.dates or week_dates(today)
+        hits = menu_index.search(
+            command.query, dates[0].strftime("%Y-%m-%d"), dates[-1].strftime("%Y-%m-%d"), codes
+        )
+    if not hits:
+        when = "coming up" if command.action == "when" else "then"
+        await post_message(f"I haven't seen {command.query} on any menu {when}.")
+        return
+    await post_message("\n".join([
+        f"{command.query.capitalize()}:",
+        *(
+            f"  • {date.fromisoformat(x.date).strftime('%a %m/%d')} at *{x.cafe}*: "
+            f"{x.item.label.title()} {icons_text(x.item.cor_icons)}".rstrip()
+            for x in hits
+        )
+    ]))
 
 
-async def post_meal(meal_type: str, channel: str, text: str) -> None:
+@POST_MEAL_SECONDS.time
+async def post_meal(command: Command, channel: str, text: str) -> None:
     """
     Determines the meal text, and posts it to the Slack channel the original message was posted in.
-    :param meal_type: 'lunch' or 'dinner'
+    :param command: the parsed message
     :param channel: the Slack channel ID that the message was posted in
     :param text: the text of the original message
     """
-    def post_message(post_text: str, timestamp=None):
-        return web_client.chat_postMessage(
-            channel=channel,
-            text=post_text,
-            icon_url=choice(CONFIG['guy_fieri_images']),
-            username='Flavorbot',
-            thread_ts=timestamp
-        )
+    async def post_message(post_text: str, timestamp=None, **kwargs):
+        return await post_as_flavorbot(channel, post_text, thread_ts=timestamp, **kwargs)
+
+    async def post_blocks(days: List[Tuple[str, str]]) -> bool:
+        """
+        Posts several days' menus as Block Kit messages, rather than a header and threaded reply per day. Returns
+        False if Slack wouldn't accept the blocks before anything was posted, so the days can be posted as threads.
+        """
+        for (posted, message) in enumerate(menu_messages(days)):
+            try:
+                await post_message(message["text"], blocks=message["blocks"])
+            except SlackApiError as e:
+                if posted or e.response.get("error") not in BLOCK_ERRORS:
+                    raise
+                logging.warning(f"falling back to threaded replies: {e.response.get('error')}")
+                return False
+        return True
 
     async def get_data(date_: date) -> Tuple[str, str, str, str]:
         try:
-            items = await cafe.menu_items(date_.strftime("%Y-%m-%d"))
-        except LookupError:
+            items = await cafe.menu_items(date_.strftime("%Y-%m-%d"), dietary=command.dietary)
+        except (LookupError, CircuitOpenError):
             items = f"Unable to retrieve menu items."
         return (
             meal_type,
@@ -161,19 +428,46 @@ async def post_meal(meal_type: str, channel: str, text: str) -> None:
             items
         )
 
-    cafe, utc_offset = get_cafe(text)
-    when = parse_message_for_day(text, utc_offset)
+    async def get_summary(date_: date) -> Tuple[str, str]:
+        """
+        Every requested café's menu for the day, compacted into a single (header, body).
+        """
+        results = await fan_out(
+            {x: cafes[x] for x in command.fan_out if x in cafes},
+            date_.strftime("%Y-%m-%d"),
+            dietary=command.dietary,
+            **CONFIG.get("fan_out", {})
+        )
+        return (
+            f"{meal_type} at {len(results)} cafés on {date_.strftime('%m/%d/%Y')}{only}",
+            "\n".join(f"*{x.nickname}* ({x.cafe.cafe_name}): {x.text or f'_{x.error}_'}" for x in results)
+        )
+
+    meal_type = command.meal
+    only = f" ({command.dietary} only)" if command.dietary else ""
+    cafe = cafes[command.cafe]
+    when = command.dates
     if not when:
-        post_message(
+        await post_message(
             f"I'm sure it'll be {choice(CONFIG['guy_fieri_phrases'])}, but I've got no idea what's for "
             f"{meal_type}{text.lower().split(meal_type)[1] or ''}"
             "\nFor a usage guide, type '@Benbot help'"
         )
     else:
-        data = await asyncio.gather(*[get_data(date_) for date_ in when])
-        for (meal, cafe_name, meal_date, output) in data:
-            ts = post_message(f"{meal} for {cafe_name} on {meal_date}")["ts"]
-            post_message(output, timestamp=ts)
+        if command.fan_out:
+            days = await asyncio.gather(*[get_summary(date_) for date_ in when])
+        else:
+            data = await asyncio.gather(*[get_data(date_) for date_ in when])
+            days = [
+                (f"{meal} for {cafe_name} on {meal_date}{only}", output)
+                for (meal, cafe_name, meal_date, output) in data
+            ]
+        if (command.fan_out or len(days) > 1) and await post_blocks(days):
+            return
+        for (header, output) in days:
+            # the header must be posted first, as its timestamp is needed to thread the menu beneath it
+            ts = (await post_message(header))["ts"]
+            await post_message(output, timestamp=ts)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+End to end benchmark of the bot, entirely offline. The saved café page is served by a local stand-in for
+cafebonappetit.com, Slack's Web API is faked locally too, and synthetic `app_mention` events are posted to the
+`/mention` route. For each scenario it reports throughput, p50/p99 latency (both of acknowledging the mention, and of
+the last message being posted for it) and how many requests reached the cafés' sites and Slack.
+
+Run from the repo root with `python -m src.benchmarks.bench_bot [mentions] [cafés]`. The bot's config is replaced
+with one pointing at the fakes before it's ever read, so no config file is needed.
+"""
+import asyncio
+import json
+import os
+from statistics import quantiles
+import sys
+import time
+from typing import Dict, List, Tuple
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src import ABS_ROOT, CONFIG
+
+FIXTURE = os.path.join(ABS_ROOT, "src", "unittests", "fixtures", "cafe_page.html")
+SCENARIOS = (
+    ("single day", "<@UBENCH> lunch"),
+    ("week", "<@UBENCH> lunch week"),
+    ("multi-café", "<@UBENCH> lunch all"),
+)
+
+
+class FakeCafeSite:
+    """
+    Serves the saved café page for every café and date.
+    """
+    def __init__(self, body: bytes):
+        self.body = body
+        self.requests = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        return web.Response(body=self.body, content_type="text/html")
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/cafe/{cafe}/{date}", self.handle)
+        return app
+
+
+class FakeSlack:
+    """
+    Accepts every Web API call, noting when each channel was last posted to.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.last_post: Dict[str, float] = {}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        data = await request.json() if request.content_type == "application/json" else dict(await request.post())
+        self.last_post[data.get("channel", "")] = time.perf_counter()
+        return web.json_response({"ok": True, "channel": data.get("channel"), "ts": f"{time.time():.6f}"})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/api/{method}", self.handle)
+        return app
+
+
+def bench_config(cafe_url: str, slack_url: str, cafes: int) -> dict:
+    return {
+        "tokens": {"slack_token": "xoxb-bench"},
+        "slack_base_url": f"{slack_url}/api/",
+        "cafes": {
+            ("default" if i == 0 else f"cafe{i}"): {
+                "company": "bench",
+                "name": f"cafe{i}",
+                "utc_offset": 0,
+                "base_url": f"{cafe_url}/cafe/cafe{i}",
+            }
+            for i in range(cafes)
+        },
+        "supervisor": {"workers": 16, "max_queue": 100000, "max_per_channel": 100000},
+        "slack_queue": {"workers": 16, "rate_limit": False},
+        "whitelist_channels": [],
+        "guy_fieri_images": ["http://localhost/guy-fieri.jpg"],
+        "guy_fieri_phrases": ["off the hook"],
+    }
+
+
+def percentiles(values: List[float]) -> Tuple[float, float]:
+    if len(values) < 2:
+        return (values or [0.0])[0], (values or [0.0])[0]
+    cuts = quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[98]
+
+
+async def run_scenario(bot, client, site: FakeCafeSite, slack: FakeSlack, name: str, text: str, mentions: int):
+    bot.menu_cache.clear()
+    site_requests, slack_calls = site.requests, slack.calls
+    started: Dict[str, float] = {}
+    acks: List[float] = []
+    semaphore = asyncio.Semaphore(64)
+
+    async def mention(i: int):
+        channel = f"C{name.replace(' ', '')}{i}"
+        payload = {
+            "event_id": f"Ev{name.replace(' ', '')}{i}",
+            "event": {"type": "app_mention", "channel": channel, "text": text, "user": "UBENCH"},
+        }
+        async with semaphore:
+            started[channel] = time.perf_counter()
+            response = await client.post(
+                "/mention", data=json.dumps(payload), headers={"Content-Type": "application/json"}
+            )
+            acks.append(time.perf_counter() - started[channel])
+            assert response.status_code == 200
+
+    began = time.perf_counter()
+    await asyncio.gather(*[mention(i) for i in range(mentions)])
+    # every handler awaits its own Slack posts, so the work is done once the supervisor is idle
+    while bot.supervisor.stats()["queued"] or bot.supervisor.stats()["running"]:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - began
+    latencies = [slack.last_post[x] - y for (x, y) in started.items() if x in slack.last_post]
+    ack_p50, ack_p99 = percentiles(acks)
+    p50, p99 = percentiles(latencies)
+    print(
+        f"{name:<12}{mentions / elapsed:>10.0f}/s"
+        f"{ack_p50 * 1e3:>10.2f}{ack_p99 * 1e3:>10.2f}"
+        f"{p50 * 1e3:>10.2f}{p99 * 1e3:>10.2f}"
+        f"{site.requests - site_requests:>10}{slack.calls - slack_calls:>10}"
+        f"{len(latencies):>10}"
+    )
+
+
+async def main(mentions: int = 500, cafes: int = 4):
+    with open(FIXTURE, "rb") as f:
+        site = FakeCafeSite(f.read())
+    slack = FakeSlack()
+    async with TestServer(site.app()) as site_server, TestServer(slack.app()) as slack_server:
+        CONFIG.swap(bench_config(
+            str(site_server.make_url("")).rstrip("/"), str(slack_server.make_url("")).rstrip("/"), cafes
+        ))
+        # the bot is built from the config when its app starts
+        from src import benbot6
+
+        async with benbot6.app.test_app() as app:
+            # the benchmark measures serving mentions, not warming the cache
+            await benbot6.prefetcher.stop()
+            client = app.test_client()
+            print(f"{mentions} mentions per scenario, {cafes} cafés")
+            print(
+                f"{'scenario':<12}{'thruput':>12}{'ack p50':>10}{'ack p99':>10}"
+                f"{'done p50':>10}{'done p99':>10}{'upstream':>10}{'slack':>10}{'answered':>10}"
+            )
+            for (name, text) in SCENARIOS:
+                await run_scenario(benbot6, client, site, slack, name, text, mentions)
+            print("latencies in ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:])))
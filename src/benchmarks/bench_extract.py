@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Compares the streaming `Bamco.*` extractor against the original full page decode + splitlines scan, on the saved
+fixture page. Run from the repo root with `python -m src.benchmarks.bench_extract`.
+"""
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+from src.bamco import BamcoExtractor, CHUNK_SIZE
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "unittests", "fixtures", "cafe_page.html")
+
+
+def legacy(body: bytes) -> dict:
+    for line in body.decode().splitlines():
+        if "Bamco.menu_items" in line:
+            return json.loads(line.split("= ")[1][:-1])
+    raise LookupError
+
+
+def streaming(body: bytes) -> dict:
+    return streaming_with_read(body)[0]
+
+
+def streaming_with_read(body: bytes):
+    extractor = BamcoExtractor()
+    read = 0
+    for i in range(0, len(body), CHUNK_SIZE):
+        chunk = body[i:i + CHUNK_SIZE]
+        read += len(chunk)
+        if extractor.feed(chunk):
+            break
+    return extractor.close().menu_items, read
+
+
+def peak_memory(func, body: bytes) -> int:
+    tracemalloc.start()
+    func(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main(number: int = 200):
+    with open(FIXTURE, "rb") as f:
+        body = f.read()
+    assert legacy(body) == streaming(body)
+    read = streaming_with_read(body)[1]
+    print(f"fixture: {len(body):,} bytes, {len(legacy(body))} menu items")
+    print(f"{'':<10}{'ms/page':>10}{'bytes read':>14}{'peak memory':>14}")
+    for name, func, bytes_read in (("legacy", legacy, len(body)), ("streaming", streaming, read)):
+        per_call = min(timeit.repeat(lambda: func(body), number=number, repeat=3)) / number * 1000
+        print(f"{name:<10}{per_call:>10.3f}{bytes_read:>14,}{peak_memory(func, body):>14,}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
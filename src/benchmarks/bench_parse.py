@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Compares benbot5's original `reduce` based add-meal parsing with its single pass `scan_meal`, on one very long pasted
+menu and on a bulk backfill of many weeks of ordinary menus, checking that both give the same result.
+
+benbot5 is the Google Sheets and RTM bot that benbot6 replaced, and it can't be imported from `src` like the other
+benchmarks' modules. It imports as `benbot.benbot5`, from a `benbot` package providing `get_root()`. It needs
+pygsheets and slackclient 2 (the `slack` package), neither of which is in requirements.txt. It also reads
+`config/config.yml` under `get_root()` when imported. So like `test_benbot.py`, this only runs in a benbot 5
+environment. There, run it from the repo root with `python -m src.benchmarks.bench_parse [number] [weeks]`.
+"""
+from functools import reduce
+from random import Random
+import re
+import sys
+import timeit
+from typing import List
+
+from dateutil import parser
+
+try:
+    from benbot import benbot5
+except ImportError as e:
+    sys.exit(f"bench_parse needs benbot 5's environment, see its docstring: {e!r}")
+
+WORDS = "roasted chicken garlic lemon herb rice seasonal vegetables grilled tofu sesame ginger ramen miso kale".split()
+NOTES = ("(contains dairy & soy)", "(contains 2 eggs; bun contains gluten)", "- vegan", "- vegetarian", "")
+
+
+def week_menu(random: Random, items_per_day: int) -> str:
+    lines = []
+    for (i, day) in enumerate(benbot5.WEEK_DAYS):
+        lines.extend([f"{day} ~ ", f"06/{17 + i:02d}"])
+        for _ in range(items_per_day):
+            lines.append(f"{' '.join(random.sample(WORDS, 3)).upper()} {random.choice(NOTES)}")
+            lines.append(f"{', '.join(random.sample(WORDS, 4))}  ")
+            lines.append("")
+    return "\n".join(lines)
+
+
+def legacy_parse_meal(meal_text: str):
+    processed_text = [y for y in (x.rstrip() for x in meal_text.splitlines()) if y]
+    translation_table = str.maketrans({x: None for x in "(){}<>"})
+
+    def parse_with_none(string):
+        try:
+            output = parser.parse(string.translate(translation_table))
+        except ValueError:
+            output = None
+        return output
+
+    numerics = filter(lambda x: any(y.isnumeric() for y in x), processed_text)
+    dates = [x for x in {parse_with_none(x) for x in numerics} if x]
+
+    def line_reduction(x: tuple, y: str):
+        upper_y = y.upper()
+        if any(z in upper_y for z in benbot5.WEEK_DAYS):
+            tracking_day = re.search(r'(MON|TUES|WEDNES|THURS|FRI)DAY', upper_y).group()
+            update = {tracking_day: f"*{tracking_day}*\n"}
+        else:
+            tracking_day = x[0] or "MONDAY"
+            update = {tracking_day: x[1].get(tracking_day) + y + "\n"}
+        return tracking_day, {**x[1], **update}
+
+    return reduce(line_reduction, processed_text, ('', {z: "" for z in benbot5.WEEK_DAYS}))[1], dates
+
+
+def same(expected, actual) -> bool:
+    return expected[0] == actual[0] and set(expected[1]) == set(actual[1])
+
+
+def main(number: int = 3, weeks: int = 200):
+    random = Random(7)
+    long_menu = week_menu(random, 400)
+    backfill: List[str] = [week_menu(random, 8) for _ in range(weeks)]
+    assert same(legacy_parse_meal(long_menu), benbot5.parse_meal(long_menu))
+    assert all(same(legacy_parse_meal(x), benbot5.parse_meal(x)) for x in backfill)
+    cases = (
+        (f"long menu ({len(long_menu.splitlines())} lines)", lambda: legacy_parse_meal(long_menu),
+         lambda: benbot5.parse_meal(long_menu)),
+        (f"backfill ({weeks} weeks)", lambda: [legacy_parse_meal(x) for x in backfill],
+         lambda: [benbot5.parse_meal(x) for x in backfill]),
+    )
+    for (name, legacy, current) in cases:
+        legacy_time = min(timeit.repeat(legacy, number=number, repeat=3)) / number * 1e3
+        current_time = min(timeit.repeat(current, number=number, repeat=3)) / number * 1e3
+        print(f"{name:<28}{legacy_time:>10.1f} ms legacy{current_time:>10.1f} ms single pass")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
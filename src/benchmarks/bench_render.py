@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Compares rendering a 200 item menu with the original async `Cafe.items_to_text`, the synchronous renderer, and a
+render already cached on its menu cache entry. Run from the repo root with `python -m src.benchmarks.bench_render`.
+"""
+import asyncio
+from datetime import date
+from random import Random
+import sys
+import timeit
+
+from src.menu_cache import MenuCache
+from src.menu_model import DailyMenu, MenuItem
+from src.render import render
+
+WORDS = "roasted chicken garlic lemon herb rice seasonal vegetables grilled tofu sesame ginger ramen miso kale".split()
+
+
+def menu(size: int = 200) -> DailyMenu:
+    random = Random(7)
+    return DailyMenu(
+        MenuItem(
+            " ".join(random.sample(WORDS, 3)),
+            " ".join(random.sample(WORDS, 10)),
+            random.choice(["@grill", "@entrées", "@soup"]),
+            random.sample(["1", "3", "4", "6", "9"], random.randint(0, 2)),
+        )
+        for _ in range(size)
+    )
+
+
+async def convert_cor_icons(item: MenuItem):
+    cor_icons = {
+        "1": "[V]",
+        "3": "[SW]",
+        "4": "[Ve]",
+        "6": "[FF]",
+        "9": "[GF]"
+    }
+    return "".join(cor_icons.get(i, "") for i in item.cor_icons)
+
+
+async def items_to_text(items: DailyMenu) -> str:
+    return "\n".join([
+        "  • "
+        f"*{val.label.title()}* {await convert_cor_icons(val)}: "
+        f"{val.description.capitalize()}." for val in items
+    ])
+
+
+def main(number: int = 2000):
+    items = menu()
+    entry = MenuCache().put("cafe", "2022-03-09", items, date(2022, 3, 9))
+    loop = asyncio.new_event_loop()
+    assert loop.run_until_complete(items_to_text(items)) == render(items) == entry.render()
+    cases = (
+        ("legacy async", lambda: loop.run_until_complete(items_to_text(items))),
+        ("render", lambda: render(items)),
+        ("render vegan", lambda: render(items, dietary="vegan")),
+        ("cached", lambda: entry.render()),
+    )
+    print(f"{len(items)} items")
+    for name, func in cases:
+        per_call = min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+        print(f"{name:<14}{per_call:>10.1f} µs/render")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,72 @@
+from typing import Iterable, List, Tuple
+
+# Slack's limits, see https://api.slack.com/reference/block-kit/blocks
+MAX_BLOCKS = 50
+MAX_SECTION_TEXT = 3000
+MAX_HEADER_TEXT = 150
+MAX_FALLBACK_TEXT = 3000
+
+
+def split_text(text: str, limit: int = MAX_SECTION_TEXT) -> List[str]:
+    """
+    Splits text into pieces no longer than the limit, breaking between lines where possible.
+    :param text: the text to split
+    :param limit: maximum length of each piece
+    """
+    pieces = []
+    current = ""
+    for line in text.splitlines():
+        while len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            pieces.append(current)
+            current = line
+        else:
+            current = f"{current}\n{line}" if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def day_blocks(header: str, body: str) -> List[dict]:
+    """
+    A header block followed by as many section blocks as the body needs.
+    :param header: e.g. "lunch for cafe on 03/09/2022"
+    :param body: the day's menu text, in mrkdwn
+    """
+    return [
+        {"type": "header", "text": {"type": "plain_text", "text": header[:MAX_HEADER_TEXT]}},
+        *({"type": "section", "text": {"type": "mrkdwn", "text": x}} for x in split_text(body) or [" "]),
+    ]
+
+
+def menu_messages(days: Iterable[Tuple[str, str]]) -> List[dict]:
+    """
+    Renders several days of menus into as few Slack messages as possible, each within Slack's block limit. A day is
+    only split across messages when it doesn't fit in a message on its own.
+    :param days: (header, body) for each day
+    :return: the keyword arguments (text and blocks) for each `chat.postMessage` call
+    """
+    messages = []
+    blocks: List[dict] = []
+    headers: List[str] = []
+    for header, body in days:
+        new = day_blocks(header, body)
+        if blocks and len(blocks) + 1 + len(new) > MAX_BLOCKS:
+            messages.append((headers, blocks))
+            blocks, headers = [], []
+        if blocks:
+            blocks.append({"type": "divider"})
+        headers.append(header)
+        blocks.extend(new)
+        while len(blocks) > MAX_BLOCKS:
+            messages.append((headers, blocks[:MAX_BLOCKS]))
+            blocks, headers = blocks[MAX_BLOCKS:], [header]
+    if blocks:
+        messages.append((headers, blocks))
+    # the text is only shown in notifications, and by clients that can't show blocks
+    return [{"text": "\n".join(x)[:MAX_FALLBACK_TEXT], "blocks": y} for (x, y) in messages]
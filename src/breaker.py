@@ -0,0 +1,80 @@
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of making a call while the circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream that keeps failing, so callers fail fast rather than each waiting out its timeout. After
+    `failure_threshold` consecutive failures the breaker opens for `reset_timeout` seconds, then lets a single trial
+    call through: the breaker closes again if it succeeds, and re-opens if it fails.
+    """
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        """
+        :param failure_threshold: consecutive failures that open the breaker
+        :param reset_timeout: seconds the breaker stays open before a trial call is allowed
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._state = CLOSED
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial = False
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be made now. While half open only one trial call is allowed at a time.
+        """
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self._state = CLOSED
+        self._trial = False
+
+    def release(self) -> None:
+        """
+        Ends a call that neither succeeded nor failed, such as one that was cancelled.
+        """
+        self._trial = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self._state != OPEN:
+                self.times_opened += 1
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+            self._trial = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+        }
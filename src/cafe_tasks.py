@@ -0,0 +1,47 @@
+from abc import ABC, abstractmethod
+import asyncio
+from typing import Dict, Iterable, Tuple
+
+from src.get_menu import Cafe
+
+
+class CafeTasks(ABC):
+    """
+    Runs a long-lived task for each café, such as its prefetch or daily digest, following the cafés as they're added,
+    removed or replaced.
+    """
+    def __init__(self, cafes: Dict[str, Cafe]):
+        """
+        :param cafes: the cafés to run a task for, by nickname
+        """
+        self.cafes = cafes
+        # the café each nickname's task is running for, and the task
+        self._tasks: Dict[str, Tuple[Cafe, asyncio.Task]] = {}
+
+    def start(self) -> None:
+        for (nickname, cafe) in self.cafes.items():
+            if nickname not in self._tasks:
+                self._tasks[nickname] = (cafe, asyncio.create_task(self._run(nickname, cafe)))
+
+    async def stop(self) -> None:
+        await self._cancel(list(self._tasks))
+
+    async def sync(self) -> None:
+        """
+        Follows changes to `cafes`, such as after the config is reloaded: the tasks of cafés that were removed or
+        replaced are cancelled, and those added (or replacing them) are started.
+        """
+        await self._cancel([x for (x, (cafe, _)) in self._tasks.items() if self.cafes.get(x) is not cafe])
+        self.start()
+
+    async def _cancel(self, nicknames: Iterable[str]) -> None:
+        tasks = [self._tasks.pop(x)[1] for x in nicknames]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @abstractmethod
+    async def _run(self, nickname: str, cafe: Cafe) -> None:
+        """
+        The café's task, run until it's cancelled.
+        """
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable, Iterator, List, Mapping, Optional, Tuple
+
+import yaml
+
+# sections every config needs, and the settings every café needs
+REQUIRED_SECTIONS = ("tokens", "cafes", "guy_fieri_images", "guy_fieri_phrases")
+REQUIRED_CAFE_SETTINGS = ("company", "name", "utc_offset")
+
+
+def validate(config: Any) -> dict:
+    """
+    Checks a parsed config has everything the bot needs, so a half-written config file is never swapped in.
+    :param config: the parsed YAML
+    :return: the config
+    """
+    if not isinstance(config, dict):
+        raise ValueError("config is not a mapping")
+    if missing := [x for x in REQUIRED_SECTIONS if x not in config]:
+        raise ValueError(f"config is missing {', '.join(missing)}")
+    for (nickname, cafe) in config["cafes"].items():
+        if missing := [x for x in REQUIRED_CAFE_SETTINGS if x not in (cafe or {})]:
+            raise ValueError(f"café {nickname} is missing {', '.join(missing)}")
+    return config
+
+
+class Config(Mapping):
+    """
+    The bot's config, read from its YAML file the first time it's used rather than on import. The whole config is
+    swapped at once on reload, so a lookup sees either the old config or the new one, never a mix of the two.
+    """
+    def __init__(self, path: str):
+        """
+        :param path: the config file
+        """
+        self.path = path
+        # modification time of the file when it was last read, None until it has been
+        self.mtime: Optional[int] = None
+        self._data: Optional[dict] = None
+
+    def _current(self) -> dict:
+        if self._data is None:
+            self.mtime, self._data = self.read()
+        return self._data
+
+    def __getitem__(self, key: str) -> Any:
+        return self._current()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._current())
+
+    def __len__(self) -> int:
+        return len(self._current())
+
+    def read(self) -> Tuple[int, dict]:
+        """
+        Reads the config file, without swapping it in.
+        :return: (the file's modification time, the validated config)
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path) as conf:
+            return mtime, validate(yaml.safe_load(conf))
+
+    def swap(self, data: dict) -> dict:
+        """
+        Replaces the config, e.g. with the benchmarks' config pointing at fake cafés and a fake Slack.
+        :param data: the new config
+        :return: the config replaced
+        """
+        previous, self._data = self._data, data
+        return previous if previous is not None else {}
+
+
+class ConfigWatcher:
+    """
+    Watches the config file, swapping in its new contents whenever it changes and telling the listeners, so that
+    cafés can be added or removed without restarting the bot. A config that can't be read or is missing something is
+    logged and ignored, keeping the config already in use.
+    """
+    def __init__(self, config: Config, interval: float = 5):
+        """
+        :param config: the config to reload
+        :param interval: seconds between checks of the file's modification time
+        """
+        self.config = config
+        self.interval = interval
+        # awaited with (old config, new config) after each reload
+        self.listeners: List[Callable[[Mapping, Mapping], Awaitable[None]]] = []
+        self.reloads = 0
+        self.failures = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # the config in use is the baseline, even if it was never read from the file
+        self.config.mtime = self.config.mtime or self._mtime()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def _mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.config.path).st_mtime_ns
+        except OSError:
+            return None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            if self._mtime() != self.config.mtime:
+                await self.reload()
+
+    async def reload(self) -> bool:
+        """
+        Reads the config file and swaps it in, if it can be read and is valid.
+        :return: whether the new config was swapped in
+        """
+        try:
+            mtime, data = await asyncio.get_running_loop().run_in_executor(None, self.config.read)
+        except (OSError, yaml.YAMLError, ValueError) as e:
+            self.failures += 1
+            # not retried until the file changes again
+            self.config.mtime = self._mtime()
+            logging.error(f"keeping the current config, unable to reload {self.config.path}: {e!r}")
+            return False
+        self.config.mtime = mtime
+        previous = self.config.swap(data)
+        self.reloads += 1
+        logging.info(f"reloaded {self.config.path}")
+        for listener in self.listeners:
+            try:
+                await listener(previous, data)
+            except Exception as e:
+                logging.exception(f"applying the reloaded config failed: {e!r}")
+        return True
+
+    def stats(self) -> dict:
+        return {"reloads": self.reloads, "failures": self.failures}
@@ -0,0 +1,156 @@
+import asyncio
+from datetime import time
+import logging
+from random import uniform
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import aiohttp
+
+from src.blocks import menu_messages
+from src.breaker import CircuitOpenError
+from src.cafe_tasks import CafeTasks
+from src.get_menu import Cafe
+from src.menu_store import MenuStore
+from src.prefetch import seconds_until
+
+# digests are leased in the menu store under this in place of a company, so only one worker posts each of them
+DIGEST_LEASE = "digest"
+# long enough that the digest isn't posted again the same day, once it has been
+DIGEST_LEASE_TTL = 24 * 60 * 60
+
+
+class Digester(CafeTasks):
+    """
+    Pushes each café's menu to the channels subscribed to it, at a set time of the café's local day, Monday through
+    Friday. The menu is fetched and rendered once per café however many channels are subscribed, then posted to each of
+    them through the bot's Slack sender, which paces the posts to Slack's rate limits. Subscriptions are kept in the
+    menu store, if there is one, where workers sharing it also take a lease on each digest so only one of them posts it.
+    The lease is only taken once the menu is in hand, so a worker that can't fetch it leaves the digest to the others.
+    """
+    def __init__(
+            self,
+            cafes: Dict[str, Cafe],
+            post: Callable[[str, str, List[dict]], Awaitable],
+            store: Optional[MenuStore] = None,
+            run_time: str = "11:00",
+            run_times: Optional[Dict[str, str]] = None,
+            fmt: str = "text",
+            retries: int = 3,
+            backoff: float = 60
+    ):
+        """
+        :param cafes: cafés that channels can subscribe to, by nickname
+        :param post: posts (channel, text, blocks) to Slack
+        :param store: keeps the subscriptions, if not given they're only kept in memory
+        :param run_time: local time of day, "HH:MM", to post each café's digest at
+        :param run_times: local times of day to post particular cafés' digests at instead, by nickname
+        :param fmt: see `src.render.render`
+        :param retries: attempts to make at fetching the menu before giving up on the day's digest
+        :param backoff: seconds to wait before the first retry, doubled for each retry after that
+        """
+        super().__init__(cafes)
+        self.post = post
+        self.store = store
+        self.run_time = run_time
+        self.run_times = run_times if run_times is not None else {}
+        self.fmt = fmt
+        self.retries = retries
+        self.backoff = backoff
+        self.posted = 0
+        self.failed = 0
+        self._subscriptions: Dict[str, Set[str]] = {}
+
+    def run_time_for(self, nickname: str) -> time:
+        return time.fromisoformat(self.run_times.get(nickname, self.run_time))
+
+    async def _run(self, nickname: str, cafe: Cafe) -> None:
+        while True:
+            await asyncio.sleep(seconds_until([self.run_time_for(nickname)], cafe.utc_offset))
+            try:
+                await self.post_digest(nickname, cafe)
+            except Exception as e:
+                logging.exception(f"digest of {cafe.cafe_name} failed: {e!r}")
+
+    async def subscribe(self, nickname: str, channel: str) -> bool:
+        """
+        :return: whether the channel wasn't already subscribed to the café
+        """
+        if self.store is not None:
+            return await self.store.subscribe(nickname, channel)
+        channels = self._subscriptions.setdefault(nickname, set())
+        subscribed = channel not in channels
+        channels.add(channel)
+        return subscribed
+
+    async def unsubscribe(self, nicknames: Iterable[str], channel: str) -> int:
+        """
+        :return: the number of cafés the channel was unsubscribed from
+        """
+        if self.store is not None:
+            return await self.store.unsubscribe(nicknames, channel)
+        removed = [x for x in nicknames if channel in self._subscriptions.get(x, ())]
+        for nickname in removed:
+            self._subscriptions[nickname].discard(channel)
+        return len(removed)
+
+    async def subscriptions(self) -> Dict[str, Set[str]]:
+        """
+        :return: the channels subscribed to each café, by nickname
+        """
+        if self.store is not None:
+            return await self.store.subscriptions()
+        return {x: set(y) for (x, y) in self._subscriptions.items() if y}
+
+    async def post_digest(self, nickname: str, cafe: Cafe) -> int:
+        """
+        Posts the café's menu for today to every channel subscribed to it.
+        :param nickname: the café's nickname
+        :param cafe: the café
+        :return: the number of channels the menu was posted to
+        """
+        today = cafe.today()
+        if today.weekday() >= 5 or not (channels := (await self.subscriptions()).get(nickname)):
+            return 0
+        date_ = today.strftime("%Y-%m-%d")
+        if (text := await self._menu_text(cafe, date_)) is None:
+            return 0
+        if self.store is not None and not await self.store.acquire(DIGEST_LEASE, nickname, date_, DIGEST_LEASE_TTL):
+            logging.debug(f"digest of {cafe.cafe_name} for {date_} is being posted by another worker")
+            return 0
+        # split into Block Kit messages within Slack's limits, as on-demand menus are
+        messages = menu_messages([(f"Lunch at {cafe.cafe_name} today ({today.strftime('%m/%d/%Y')})", text)])
+        results = await asyncio.gather(
+            *[self._post_messages(x, messages) for x in sorted(channels)], return_exceptions=True
+        )
+        failures = [(x, y) for (x, y) in zip(sorted(channels), results) if isinstance(y, Exception)]
+        for (channel, error) in failures:
+            logging.warning(f"unable to post the digest of {cafe.cafe_name} to {channel}: {error!r}")
+        self.posted += len(results) - len(failures)
+        self.failed += len(failures)
+        return len(results) - len(failures)
+
+    async def _menu_text(self, cafe: Cafe, date_: str) -> Optional[str]:
+        """
+        The café's rendered menu for the date, retrying while its site can't be reached.
+        :return: the menu, or None if the café has none or its site couldn't be reached on any attempt
+        """
+        for attempt in range(self.retries):
+            try:
+                return await cafe.menu_items(date_, self.fmt)
+            except LookupError:
+                logging.info(f"no digest of {cafe.cafe_name} for {date_}, it has no menu")
+                return None
+            except (CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"fetching the digest of {cafe.cafe_name} for {date_} failed: {e!r}")
+                if attempt + 1 < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt + uniform(0, self.backoff))
+        logging.error(f"no digest of {cafe.cafe_name} for {date_}, its menu couldn't be fetched")
+        return None
+
+    async def _post_messages(self, channel: str, messages: List[dict]) -> None:
+        # in order, so a menu split across messages reads top to bottom
+        for message in messages:
+            await self.post(channel, message["text"], message["blocks"])
+
+    def stats(self) -> dict:
+        return {"posted": self.posted, "failed": self.failed, "cafes": len(self._tasks)}
@@ -0,0 +1,75 @@
+import logging
+import re
+import sqlite3
+from typing import Optional
+
+from cachetools import TTLCache
+
+from src.menu_store import MenuStore
+
+_EVENT_ID = re.compile(rb'"event_id"\s*:\s*"([^"]+)"')
+
+
+def peek_event_id(body: bytes) -> Optional[str]:
+    """
+    Pulls the event id out of a raw Slack event payload, without decoding the rest of the JSON.
+    :param body: the raw request body
+    """
+    if match := _EVENT_ID.search(body):
+        return match.group(1).decode()
+
+
+class EventDeduplicator:
+    """
+    Remembers recently seen Slack event ids, so that an event Slack retries (because it wasn't acknowledged quickly
+    enough) isn't handled a second time. Bounded in size, and ids are forgotten after Slack stops retrying. With a menu
+    store, the ids are shared with every other worker using it too, as a retry can reach a worker that never saw the
+    event.
+    """
+    def __init__(self, maxsize: int = 10000, ttl: float = 15 * 60, store: Optional[MenuStore] = None):
+        """
+        :param maxsize: maximum number of event ids remembered
+        :param ttl: seconds an event id is remembered for. Slack retries three times, over about five minutes
+        :param store: records the ids of events handled by any worker
+        """
+        self._seen = TTLCache(maxsize, ttl)
+        self.store = store
+        self.duplicates = 0
+        self.retries = 0
+
+    def first_sighting(self, event_id: Optional[str], retry_num: Optional[str] = None) -> bool:
+        """
+        Records the event, returning whether this is the first time it has been seen.
+        :param event_id: the event's id, events without one are never considered duplicates
+        :param retry_num: the `X-Slack-Retry-Num` header, if Slack sent one
+        """
+        if retry_num is not None:
+            self.retries += 1
+        if event_id is None:
+            return True
+        if event_id in self._seen:
+            self.duplicates += 1
+            return False
+        self._seen[event_id] = None
+        return True
+
+    async def first_delivery(self, event_id: Optional[str], retry_num: Optional[str] = None) -> bool:
+        """
+        As `first_sighting`, but also checking with the other workers, through the menu store if there is one. If the
+        store can't be reached, only this worker's events are checked.
+        """
+        if not self.first_sighting(event_id, retry_num):
+            return False
+        if self.store is None or event_id is None:
+            return True
+        try:
+            first = await self.store.record_event(event_id)
+        except sqlite3.Error as e:
+            logging.warning(f"unable to check event {event_id} with the other workers: {e!r}")
+            return True
+        if not first:
+            self.duplicates += 1
+        return first
+
+    def stats(self) -> dict:
+        return {"duplicates": self.duplicates, "retries": self.retries, "size": len(self._seen)}
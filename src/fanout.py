@@ -0,0 +1,65 @@
+import asyncio
+import logging
+from typing import Dict, List, NamedTuple, Optional, Set
+
+from src.breaker import CircuitOpenError
+from src.get_menu import Cafe
+
+# fetches that outlived their fan-out's timeout, referenced until they finish
+_unfinished: Set[asyncio.Future] = set()
+
+
+class FanOutResult(NamedTuple):
+    nickname: str
+    cafe: Cafe
+    text: Optional[str]
+    error: Optional[str]
+
+
+async def fan_out(
+        cafes: Dict[str, Cafe],
+        date_: str,
+        concurrency: int = 8,
+        timeout: float = 5,
+        fmt: str = "compact",
+        dietary: Optional[str] = None
+) -> List[FanOutResult]:
+    """
+    Gets the menu for the date from several cafés at once. A café that fails or takes too long doesn't hold up the
+    others, it's just reported as unavailable. The fetch from a café that took too long is left to finish, so that its
+    menu is cached for the next time it's asked for.
+    :param cafes: the cafés to query, by nickname
+    :param date_: str YYYY-MM-DD
+    :param concurrency: maximum number of cafés queried at a time
+    :param timeout: seconds to wait for each café
+    :param fmt: see `src.render.render`
+    :param dietary: see `src.render.render`
+    :return: a result for each café, in the order given
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def query(nickname: str, cafe: Cafe) -> FanOutResult:
+        async with semaphore:
+            fetch = asyncio.ensure_future(cafe.menu_items(date_, fmt, dietary))
+            try:
+                text = await asyncio.wait_for(asyncio.shield(fetch), timeout)
+                return FanOutResult(nickname, cafe, text, None)
+            except LookupError:
+                return FanOutResult(nickname, cafe, None, "no menu")
+            except asyncio.TimeoutError:
+                _unfinished.add(fetch)
+                fetch.add_done_callback(_finished)
+                return FanOutResult(nickname, cafe, None, "timed out")
+            except CircuitOpenError:
+                return FanOutResult(nickname, cafe, None, "unavailable")
+            except Exception as e:
+                logging.warning(f"unable to get the menu for {cafe.cafe_name}: {e!r}")
+                return FanOutResult(nickname, cafe, None, "unavailable")
+
+    return list(await asyncio.gather(*[query(x, y) for (x, y) in cafes.items()]))
+
+
+def _finished(fetch: asyncio.Future) -> None:
+    _unfinished.discard(fetch)
+    if not fetch.cancelled() and (e := fetch.exception()) is not None:
+        logging.info(f"fetch that timed out during a fan-out failed: {e!r}")
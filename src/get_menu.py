@@ -1,48 +1,340 @@
-import json
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+import logging
+from random import uniform
+import time
+from typing import Dict, NamedTuple, Optional
+
 import aiohttp
+from cachetools import LRUCache
+
+from src.bamco import CHUNK_SIZE, extract
+from src.breaker import CircuitBreaker, CircuitOpenError
+from src.menu_cache import CacheEntry, MenuCache
+from src.menu_model import DailyMenu
+from src.menu_store import MenuStore
+from src.metrics import METRICS
+from src.singleflight import SingleFlight
+
+# number of dates per café whose page version is remembered for conditional requests, enough for a couple of weeks
+VERSIONS_KEPT = 16
+# upstream failures worth another attempt; anything else (such as a 404) won't go away by asking again
+RETRYABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+# seconds a fetch lease outlives the café's deadline, to cover storing the menu fetched under it
+LEASE_GRACE = 5
+# seconds between checks of the menu store, while another worker fetches a menu
+LEASE_POLL_INTERVAL = 0.05
+
+FETCH_SECONDS = METRICS.histogram(
+    "benbot_menu_fetch_seconds", "Time spent downloading and scanning a café page", ("cafe",)
+)
+DECODE_SECONDS = METRICS.histogram(
+    "benbot_menu_decode_seconds", "Time spent decoding a café page's menu items", ("cafe",)
+)
+
+
+class PageVersion(NamedTuple):
+    """
+    What was last fetched for a date: the validators the café's site sent, and a hash of the menu items they came with.
+    """
+    etag: Optional[str]
+    last_modified: Optional[str]
+    digest: str
+    items: DailyMenu
+
+    def headers(self) -> Dict[str, str]:
+        """
+        Request headers asking for the page only if it has changed since this version.
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
 
 
 class Cafe:
-    def __init__(self, company: str, cafe_name: str):
-        self.base_url = f"https://{company}.cafebonappetit.com/cafe/{cafe_name}"
+    def __init__(
+            self,
+            company: str,
+            cafe_name: str,
+            utc_offset: int = 0,
+            cache: Optional[MenuCache] = None,
+            flights: Optional[SingleFlight] = None,
+            store: Optional[MenuStore] = None,
+            deadline: float = 10,
+            retries: int = 2,
+            backoff: float = 0.5,
+            breaker: Optional[CircuitBreaker] = None,
+            base_url: Optional[str] = None
+    ):
+        """
+        :param deadline: seconds allowed for fetching a menu from the café's site, across all attempts
+        :param retries: attempts made after the first, for connection errors, timeouts and server errors
+        :param backoff: upper bound of the random wait before the first retry in seconds, doubled for each retry
+        :param breaker: stops fetches while the café's site is down, defaults to a breaker per café
+        :param base_url: where the café's pages are, defaults to the café's page on cafebonappetit.com
+        """
+        self.base_url = base_url or f"https://{company}.cafebonappetit.com/cafe/{cafe_name}"
+        self.company = company
         self.cafe_name = cafe_name
+        self.utc_offset = utc_offset
+        self.cache = cache if cache is not None else MenuCache()
+        self.flights = flights if flights is not None else SingleFlight()
+        self.store = store
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
         self.req = None
+        self._owns_session = False
+        self._versions: LRUCache = LRUCache(VERSIONS_KEPT)
+        self.fetches = 0
+        self.not_modified = 0
+        self.unchanged = 0
+        self.stale_served = 0
+        self.fetched_elsewhere = 0
+        self._fetch_seconds = FETCH_SECONDS.labels(cafe_name)
+        self._decode_seconds = DECODE_SECONDS.labels(cafe_name)
 
-    async def initialize_session(self):
-        self.req = aiohttp.ClientSession()
-
-    @staticmethod
-    async def convert_cor_icons(item: dict):
-        cor_icons = {
-            "1": "[V]",
-            "3": "[SW]",
-            "4": "[Ve]",
-            "6": "[FF]",
-            "9": "[GF]"
-        }
-        return "".join(cor_icons.get(i, "") for i in item["cor_icon"])
+    async def initialize_session(self, session: Optional[aiohttp.ClientSession] = None):
+        """
+        :param session: a session shared with other cafés, if not given the café creates (and owns) its own
+        """
+        self._owns_session = session is None
+        self.req = session or aiohttp.ClientSession()
 
-    async def items_to_text(self, items: dict) -> str:
-        return "\n".join([
-            "  • "
-            f"*{val['label'].title()}* {await self.convert_cor_icons(val)}: "
-            f"{val['description'].capitalize()}." for val in items.values()
-        ])
+    async def close_session(self):
+        if self._owns_session:
+            await self.req.close()
 
-    async def get_menu_items(self, date_: str) -> dict:
+    def today(self) -> date:
         """
+        The current date in the café's local time zone.
+        """
+        return (datetime.now(timezone.utc) + timedelta(hours=self.utc_offset)).date()
+
+    async def get_menu_items(self, date_: str) -> DailyMenu:
+        """
+        Fetches the menu items for the date. If the date has been fetched before, the request is conditional, and the
+        menu items are only decoded if the page has changed; otherwise the previously fetched items are returned as
+        they are (the same object).
+        :param date_: str YYYY-MM-DD
+        """
+        known: Optional[PageVersion] = self._versions.get(date_)
+        self.fetches += 1
+        started = time.perf_counter()
+        async with self.req.get(f"{self.base_url}/{date_}", headers=known.headers() if known else None) as r:
+            if r.status == 304 and known is not None:
+                self.not_modified += 1
+                return known.items
+            if r.status == 404:
+                raise LookupError
+            r.raise_for_status()
+            page = await extract(r.content.iter_chunked(CHUNK_SIZE))
+            etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+        fetched = time.perf_counter()
+        self._fetch_seconds.observe(fetched - started)
+        digest = page.digest
+        if known is not None and known.digest == digest:
+            # the site doesn't support conditional requests (or changed something other than the menu)
+            self.unchanged += 1
+            items = known.items
+        else:
+            items = DailyMenu.from_bamco(page.menu_items)
+            self._decode_seconds.observe(time.perf_counter() - fetched)
+        self._versions[date_] = PageVersion(etag, last_modified, digest, items)
+        return items
+
+    async def menu_items(self, date_, fmt: str = "text", dietary: Optional[str] = None) -> str:
+        """
+        Get menu items as string for specified date. Served from the menu cache (or the menu store) when possible, so
+        that repeated requests for the same day don't hit the cafe's site again, and concurrent requests for the same
+        day share a single fetch.
         :param date_: str YYYY-MM-DD
+        :param fmt: see `src.render.render`
+        :param dietary: see `src.render.render`
         """
-        async with self.req.get(f"{self.base_url}/{date_}") as r:
-            lines = (await r.text()).splitlines()
-            for line in lines:
-                if "Bamco.menu_items" in line:
-                    return json.loads(line.split("= ")[1][:-1])
+        if (entry := self.cache.get(self.base_url, date_)) is None:
+            entry = await self.flights.do(
+                (self.base_url, date_), lambda: self._load_menu_items(date_, use_store=True, fallback=True)
+            )
+        elif entry.missing:
             raise LookupError
+        return entry.render(fmt, dietary)
 
-    async def menu_items(self, date_) -> str:
+    async def refresh(self, date_: str, ttl: Optional[float] = None) -> CacheEntry:
         """
-        Get menu items as string for specified date.
+        Fetches the menu items for the date regardless of what's cached, replacing the cached entry.
         :param date_: str YYYY-MM-DD
+        :param ttl: seconds the menu stays fresh for in the menu cache and menu store, if longer than usual for its
+            date, such as until the next prefetch
+        :return: the new entry, whose `changed` is False if the menu is the same as when it was last fetched
         """
-        return await self.items_to_text(await self.get_menu_items(date_))
+        return await self.flights.do((self.base_url, date_), lambda: self._load_menu_items(date_, ttl=ttl))
+
+    async def _stored_menu_items(self, date_: str) -> Optional[DailyMenu]:
+        """
+        Menu items for the date from the menu store, if they're there and still fresh. Menus for days that have passed
+        don't change, so are always fresh, and prefetched menus are fresh until the next prefetch.
+        :param date_: str YYYY-MM-DD
+        :raises LookupError: if the café was recently found to have no menu for the date, by this or another worker
+        """
+        if (stored := await self.store.get(self.company, self.cafe_name, date_)) is not None:
+            items, fetched_at, fresh_until = stored
+            today, now = self.today(), time.time()
+            if date_ < today.isoformat() or now - fetched_at < self.cache.ttl_for(date_, today) or (
+                    fresh_until is not None and now < fresh_until):
+                return items
+        await self._raise_if_missing(date_, time.time() - self.cache.negative_ttl)
+
+    async def _raise_if_missing(self, date_: str, since: float) -> None:
+        """
+        Raises LookupError, caching the miss, if the menu store records the café having no menu for the date since the
+        given time.
+        :param date_: str YYYY-MM-DD
+        :param since: unix time
+        """
+        if (checked_at := await self.store.missing(self.company, self.cafe_name, date_)) and checked_at >= since:
+            self.cache.put_missing(self.base_url, date_)
+            raise LookupError(f"{self.cafe_name} has no menu for {date_}")
+
+    async def _last_good_menu_items(self, date_: str) -> Optional[DailyMenu]:
+        """
+        The menu items last fetched for the date, however old they are.
+        :param date_: str YYYY-MM-DD
+        """
+        if (known := self._versions.get(date_)) is not None:
+            return known.items
+        if self.store is not None and (stored := await self.store.get(self.company, self.cafe_name, date_)):
+            return stored[0]
+
+    async def _fetch_menu_items(self, date_: str) -> DailyMenu:
+        """
+        Fetches the menu items for the date within the café's deadline, retrying transient failures after a jittered
+        backoff, and failing fast while the café's circuit breaker is open.
+        :param date_: str YYYY-MM-DD
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.base_url)
+        try:
+            items = await asyncio.wait_for(self._attempt_menu_items(date_), self.deadline)
+        except LookupError:
+            # the site answered, it just has no menu for the day
+            self.breaker.record_success()
+            raise
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            # e.g. cancelled, which says nothing about the site's health, so the trial call (if this was it) is over
+            self.breaker.release()
+            raise
+        self.breaker.record_success()
+        return items
+
+    async def _attempt_menu_items(self, date_: str) -> DailyMenu:
+        """
+        Fetches the menu items for the date, retrying transient failures after a jittered backoff.
+        :param date_: str YYYY-MM-DD
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                return await self.get_menu_items(date_)
+            except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+                error = e
+            except aiohttp.ClientResponseError as e:
+                if e.status not in RETRYABLE_STATUSES:
+                    raise
+                error = e
+            if attempt == self.retries:
+                raise error
+            logging.info(f"retrying {self.cafe_name} for {date_} after {error!r}")
+            await asyncio.sleep(uniform(0, self.backoff * 2 ** attempt))
+
+    async def _load_menu_items(
+            self, date_: str, use_store: bool = False, fallback: bool = False, ttl: Optional[float] = None
+    ) -> CacheEntry:
+        """
+        Fetches the menu items for the date, storing the result in the menu cache and menu store.
+        :param date_: str YYYY-MM-DD
+        :param use_store: use the menu store's copy of the menu items, if it has a fresh one, instead of fetching
+        :param fallback: if the café's site can't be reached, use the last menu items fetched for the date (briefly
+            cached as stale), rather than raising
+        :param ttl: see `refresh`
+        """
+        started = time.time()
+        items = await self._stored_menu_items(date_) if use_store and self.store is not None else None
+        changed = True
+        if items is None and self.store is not None:
+            leased = await self.store.acquire(self.company, self.cafe_name, date_, self.deadline + LEASE_GRACE)
+            try:
+                if not leased and (items := await self._await_stored(date_, started)) is not None:
+                    self.fetched_elsewhere += 1
+                    return self.cache.put(self.base_url, date_, items, self.today(), ttl=ttl)
+                return await self._fetch_and_cache(date_, fallback, ttl)
+            finally:
+                if leased:
+                    self.store.release(self.company, self.cafe_name, date_)
+        elif items is None:
+            return await self._fetch_and_cache(date_, fallback, ttl)
+        return self.cache.put(self.base_url, date_, items, self.today(), changed)
+
+    async def _await_stored(self, date_: str, since: float) -> Optional[DailyMenu]:
+        """
+        Waits for another worker, holding the lease on fetching the menu, to store it.
+        :param date_: str YYYY-MM-DD
+        :param since: unix time; only menu items stored after this are the other worker's
+        :return: the menu items, or None if the other worker gave up (or took too long) without storing them
+        :raises LookupError: if the other worker found the café has no menu for the date
+        """
+        deadline = time.monotonic() + self.deadline + LEASE_GRACE
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LEASE_POLL_INTERVAL)
+            leased = await self.store.leased(self.company, self.cafe_name, date_)
+            # checked after the lease, as the menu is stored before the lease is released
+            if (stored := await self.store.get(self.company, self.cafe_name, date_)) and stored[1] >= since:
+                return stored[0]
+            await self._raise_if_missing(date_, since)
+            if not leased:
+                return None
+        return None
+
+    async def _fetch_and_cache(self, date_: str, fallback: bool = False, ttl: Optional[float] = None) -> CacheEntry:
+        """
+        Fetches the menu items for the date from the café's site, storing the result in the menu cache and menu store.
+        :param date_: str YYYY-MM-DD
+        :param fallback: see `_load_menu_items`
+        :param ttl: see `refresh`
+        """
+        known: Optional[PageVersion] = self._versions.get(date_)
+        try:
+            items = await self._fetch_menu_items(date_)
+        except LookupError:
+            self.cache.put_missing(self.base_url, date_)
+            if self.store is not None:
+                # for other workers waiting on this one, and those that look for the menu soon after
+                self.store.put_missing(self.company, self.cafe_name, date_)
+            raise
+        except (CircuitOpenError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if not fallback or (items := await self._last_good_menu_items(date_)) is None:
+                raise
+            logging.warning(f"serving the last known menu of {self.cafe_name} for {date_}: {e!r}")
+            self.stale_served += 1
+            return self.cache.put_stale(self.base_url, date_, items)
+        changed = known is None or items is not known.items
+        if self.store is not None:
+            # an unchanged menu is still written, to bring its fetched time up to date
+            self.store.put(self.company, self.cafe_name, date_, items, ttl)
+        return self.cache.put(self.base_url, date_, items, self.today(), changed, ttl)
+
+    def stats(self) -> dict:
+        return {
+            "fetches": self.fetches,
+            "not_modified": self.not_modified,
+            "unchanged": self.unchanged,
+            "stale_served": self.stale_served,
+            "fetched_elsewhere": self.fetched_elsewhere,
+            "breaker": self.breaker.stats(),
+        }
@@ -0,0 +1,178 @@
+import time
+from datetime import date
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from cachetools import TLRUCache
+
+from src.menu_model import DailyMenu
+from src.metrics import METRICS
+from src.render import render
+
+RENDER_SECONDS = METRICS.histogram("benbot_menu_render_seconds", "Time spent rendering a menu as text")
+
+
+class CacheEntry(NamedTuple):
+    items: Optional[DailyMenu]
+    ttl: float
+    missing: bool
+    # rendered text of the items by (format, dietary filter), rendered on first use. Belongs to the entry, so it's
+    # thrown away along with the items they were rendered from when the menu is refreshed
+    renders: Dict[Tuple[str, Optional[str]], str]
+    # whether the items differ from those last fetched for the café and date
+    changed: bool = True
+    # the items are the last known good menu, served because the café's site couldn't be reached
+    stale: bool = False
+
+    def render(self, fmt: str = "text", dietary: Optional[str] = None) -> str:
+        """
+        :param fmt: see `src.render.render`
+        :param dietary: see `src.render.render`
+        """
+        if (text := self.renders.get((fmt, dietary))) is None:
+            started = time.perf_counter()
+            text = self.renders[(fmt, dietary)] = render(self.items, fmt, dietary)
+            RENDER_SECONDS.observe(time.perf_counter() - started)
+        return text
+
+
+class MenuCache:
+    """
+    Bounded LRU cache of menu lookups, keyed by (cafe base url, date). Each entry expires based on the date it holds:
+    menus for past days don't change so are kept for a long time, today's menu may still be edited by the cafe so it
+    is only kept briefly, and failed lookups are negatively cached for a short while.
+    """
+    def __init__(
+            self,
+            maxsize: int = 512,
+            past_ttl: float = 7 * 24 * 60 * 60,
+            today_ttl: float = 10 * 60,
+            future_ttl: float = 60 * 60,
+            negative_ttl: float = 2 * 60
+    ):
+        """
+        :param maxsize: maximum number of (cafe, date) entries held before the least recently used is evicted
+        :param past_ttl: seconds to keep menus for days before today
+        :param today_ttl: seconds to keep today's menu
+        :param future_ttl: seconds to keep menus for days after today
+        :param negative_ttl: seconds to remember that a menu could not be found
+        """
+        self.past_ttl = past_ttl
+        self.today_ttl = today_ttl
+        self.future_ttl = future_ttl
+        self.negative_ttl = negative_ttl
+        self._cache = TLRUCache(maxsize, lambda _key, entry, now: now + entry.ttl, timer=time.monotonic)
+        # called with (base url, date, menu items) whenever a menu is cached
+        self.listeners: List[Callable[[str, str, DailyMenu], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+
+    def ttl_for(self, date_: str, today: date) -> float:
+        """
+        Determines how long a menu should be cached for, based on the day it is for.
+        :param date_: str YYYY-MM-DD
+        :param today: the local date of the café
+        """
+        today_ = today.isoformat()
+        if date_ < today_:
+            return self.past_ttl
+        elif date_ == today_:
+            return self.today_ttl
+        return self.future_ttl
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, base_url: str, date_: str) -> Optional[CacheEntry]:
+        """
+        Retrieves the cached entry for the café and date, or None if there is no live entry.
+        :param base_url: the café's base url
+        :param date_: str YYYY-MM-DD
+        """
+        entry = self._cache.get((base_url, date_))
+        if entry is None:
+            self.misses += 1
+        elif entry.missing:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def contains(self, base_url: str, date_: str) -> bool:
+        """
+        Whether there is a live entry for the café and date, without counting towards the hit/miss stats.
+        :param base_url: the café's base url
+        :param date_: str YYYY-MM-DD
+        """
+        return (base_url, date_) in self._cache
+
+    def put(
+            self,
+            base_url: str,
+            date_: str,
+            items: DailyMenu,
+            today: date,
+            changed: bool = True,
+            ttl: Optional[float] = None
+    ) -> CacheEntry:
+        """
+        Caches the parsed menu items. If the items are unchanged from those already cached, the entry keeps its
+        renders rather than rendering them all again.
+        :param base_url: the café's base url
+        :param date_: str YYYY-MM-DD
+        :param items: the parsed menu items
+        :param today: the local date of the café
+        :param changed: whether the items differ from those last fetched, listeners are only told of changed items
+        :param ttl: seconds to keep the items for, if longer than usual for their date, such as until the next prefetch
+        """
+        previous = self._cache.get((base_url, date_))
+        renders = previous.renders if previous is not None and previous.items is items else {}
+        ttl = max(ttl or 0, self.ttl_for(date_, today))
+        entry = self._cache[(base_url, date_)] = CacheEntry(items, ttl, False, renders, changed)
+        if changed:
+            for listener in self.listeners:
+                listener(base_url, date_, items)
+        return entry
+
+    def put_stale(self, base_url: str, date_: str, items: DailyMenu) -> CacheEntry:
+        """
+        Caches the last known menu items while the café's site can't be reached. They're only kept as long as a failed
+        lookup would be, so the site is tried again soon.
+        :param base_url: the café's base url
+        :param date_: str YYYY-MM-DD
+        :param items: the last menu items fetched for the date
+        """
+        entry = self._cache[(base_url, date_)] = CacheEntry(items, self.negative_ttl, False, {}, False, True)
+        return entry
+
+    def put_missing(self, base_url: str, date_: str) -> None:
+        """
+        Records that no menu could be found for the café and date.
+        :param base_url: the café's base url
+        :param date_: str YYYY-MM-DD
+        """
+        self._cache[(base_url, date_)] = CacheEntry(None, self.negative_ttl, True, {})
+
+    def drop(self, base_url: str) -> int:
+        """
+        Removes every entry for the café, such as once it's been removed from the config.
+        :param base_url: the café's base url
+        :return: the number of entries removed
+        """
+        keys = [x for x in list(self._cache.keys()) if x[0] == base_url]
+        for key in keys:
+            self._cache.pop(key, None)
+        return len(keys)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self.hits = self.misses = self.negative_hits = 0
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "size": len(self),
+            "maxsize": self._cache.maxsize,
+        }
@@ -0,0 +1,91 @@
+import json
+import re
+import sys
+from typing import Dict, Iterable, Iterator, Tuple
+
+_TAGS = re.compile(r"<[^>]+>")
+# every distinct combination of dietary icon codes, so items sharing a combination share one tuple
+_ICON_SETS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+def _icon_set(codes: Iterable[str]) -> Tuple[str, ...]:
+    codes = tuple(sys.intern(str(x)) for x in codes)
+    return _ICON_SETS.setdefault(codes, codes)
+
+
+class MenuItem:
+    """
+    A single menu item, holding only the fields that are rendered or filtered on.
+    """
+    __slots__ = ("label", "description", "station", "cor_icons")
+
+    def __init__(self, label: str, description: str, station: str = "", cor_icons: Iterable[str] = ()):
+        """
+        :param label: the item's name
+        :param description: the item's description
+        :param station: the station serving the item, e.g. "@grill"
+        :param cor_icons: dietary icon codes, e.g. ("1", "9") for vegetarian and gluten-free
+        """
+        self.label = label
+        self.description = description
+        self.station = sys.intern(station)
+        self.cor_icons = _icon_set(cor_icons)
+
+    @classmethod
+    def from_bamco(cls, item: dict) -> "MenuItem":
+        """
+        :param item: a single value of the `Bamco.menu_items` dict
+        """
+        return cls(
+            item.get("label", ""),
+            item.get("description", ""),
+            _TAGS.sub("", item.get("station") or ""),
+            # `cor_icon` is a dict of code: label, or an empty list when the item has none
+            item.get("cor_icon") or ()
+        )
+
+    def to_row(self) -> list:
+        return [self.label, self.description, self.station, list(self.cor_icons)]
+
+    @classmethod
+    def from_row(cls, row: list) -> "MenuItem":
+        return cls(*row)
+
+    def __eq__(self, other):
+        return isinstance(other, MenuItem) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"MenuItem({self.label!r}, station={self.station!r}, cor_icons={self.cor_icons!r})"
+
+
+class DailyMenu:
+    """
+    A café's menu items for a single day.
+    """
+    __slots__ = ("items",)
+
+    def __init__(self, items: Iterable[MenuItem] = ()):
+        self.items = tuple(items)
+
+    @classmethod
+    def from_bamco(cls, menu_items: dict) -> "DailyMenu":
+        """
+        :param menu_items: the `Bamco.menu_items` dict from a café's page
+        """
+        return cls(MenuItem.from_bamco(x) for x in menu_items.values())
+
+    def to_bytes(self) -> bytes:
+        return json.dumps([x.to_row() for x in self.items], ensure_ascii=False, separators=(",", ":")).encode()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "DailyMenu":
+        return cls(MenuItem.from_row(x) for x in json.loads(data))
+
+    def __iter__(self) -> Iterator[MenuItem]:
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __eq__(self, other):
+        return isinstance(other, DailyMenu) and self.items == other.items
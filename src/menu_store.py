@@ -0,0 +1,314 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+import uuid
+import zlib
+
+from src import ABS_ROOT
+from src.menu_model import DailyMenu
+
+# seconds between clearing out expired leases, such as those of workers that died holding them and the day-long leases
+# on digests, along with old records of missing menus and Slack events
+LEASE_SWEEP_INTERVAL = 60 * 60
+# seconds a record of a missing menu is kept, well beyond the time it's trusted for
+MISSING_KEPT = 24 * 60 * 60
+# seconds a Slack event id is kept, well beyond the five or so minutes over which Slack retries an event
+EVENTS_KEPT = 60 * 60
+
+
+def pack(items: DailyMenu) -> bytes:
+    """
+    Compact row format for a day's menu items.
+    """
+    return zlib.compress(items.to_bytes(), 6)
+
+
+def unpack(data: bytes) -> DailyMenu:
+    return DailyMenu.from_bytes(zlib.decompress(data))
+
+
+class MenuStore:
+    """
+    Persists parsed menus to a SQLite database (in WAL mode), keyed by (company, café, date), so that a restart doesn't
+    throw away everything that has been fetched. All database access happens on a single background thread, so
+    neither reads nor writes block the event loop, and writes are fire-and-forget from the request path.
+
+    Every worker process on a host can share the same database, so a menu fetched by one is served from the store by
+    the rest. Leases on (company, café, date) make sure only one of them fetches a given menu at a time: the others
+    wait for it to be stored instead. A lease expires on its own, in case its worker dies while holding it. When the
+    café has no menu for the day, that is recorded too, so the others don't go and fetch it themselves.
+
+    It also keeps the channels subscribed to each café's daily digest, so they too survive restarts and are shared by
+    every worker, and the ids of the Slack events any worker has handled, so a retried event reaching another worker
+    isn't handled twice.
+    """
+    def __init__(self, path: str = "data/menus.sqlite3"):
+        """
+        :param path: the database file, relative to the repo root unless absolute
+        """
+        self.path = os.path.join(ABS_ROOT, path)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="menu-store")
+        self._con: Optional[sqlite3.Connection] = None
+        self._pending: Set[asyncio.Future] = set()
+        # identifies this store's leases, unique across every worker sharing the database
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex}"
+        self._next_sweep = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        # only ever called from the store's own thread
+        if self._con is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._con = sqlite3.connect(self.path, check_same_thread=False)
+            self._con.execute("PRAGMA journal_mode=WAL")
+            self._con.execute("PRAGMA synchronous=NORMAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS menus ("
+                "company TEXT, cafe TEXT, date TEXT, fetched_at REAL, items BLOB, fresh_until REAL, "
+                "PRIMARY KEY (company, cafe, date)) WITHOUT ROWID"
+            )
+            if "fresh_until" not in {x[1] for x in self._con.execute("PRAGMA table_info(menus)")}:
+                # a database created before menus could be kept fresh for longer than usual
+                self._con.execute("ALTER TABLE menus ADD COLUMN fresh_until REAL")
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS leases ("
+                "company TEXT, cafe TEXT, date TEXT, owner TEXT, expires_at REAL, "
+                "PRIMARY KEY (company, cafe, date)) WITHOUT ROWID"
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS missing ("
+                "company TEXT, cafe TEXT, date TEXT, checked_at REAL, "
+                "PRIMARY KEY (company, cafe, date)) WITHOUT ROWID"
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS subscriptions ("
+                "nickname TEXT, channel TEXT, PRIMARY KEY (nickname, channel)) WITHOUT ROWID"
+            )
+            self._con.execute(
+                "CREATE TABLE IF NOT EXISTS events (event_id TEXT PRIMARY KEY, seen_at REAL) WITHOUT ROWID"
+            )
+            self._con.commit()
+        return self._con
+
+    def _get(self, company: str, cafe: str, date_: str) -> Optional[Tuple[DailyMenu, float, Optional[float]]]:
+        row = self._connect().execute(
+            "SELECT items, fetched_at, fresh_until FROM menus WHERE company = ? AND cafe = ? AND date = ?",
+            (company, cafe, date_)
+        ).fetchone()
+        return (unpack(row[0]), row[1], row[2]) if row else None
+
+    def _put(
+            self, company: str, cafe: str, date_: str, items: DailyMenu, fetched_at: float, fresh_until: Optional[float]
+    ) -> None:
+        con = self._connect()
+        con.execute(
+            "INSERT OR REPLACE INTO menus (company, cafe, date, fetched_at, items, fresh_until) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (company, cafe, date_, fetched_at, pack(items), fresh_until)
+        )
+        con.execute("DELETE FROM missing WHERE company = ? AND cafe = ? AND date = ?", (company, cafe, date_))
+        con.commit()
+
+    def _put_missing(self, company: str, cafe: str, date_: str, checked_at: float) -> None:
+        con = self._connect()
+        con.execute("INSERT OR REPLACE INTO missing VALUES (?, ?, ?, ?)", (company, cafe, date_, checked_at))
+        con.commit()
+
+    def _missing(self, company: str, cafe: str, date_: str) -> Optional[float]:
+        row = self._connect().execute(
+            "SELECT checked_at FROM missing WHERE company = ? AND cafe = ? AND date = ?", (company, cafe, date_)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _sweep(self, con: sqlite3.Connection, now: float) -> None:
+        if now >= self._next_sweep:
+            con.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            con.execute("DELETE FROM missing WHERE checked_at < ?", (now - MISSING_KEPT,))
+            con.execute("DELETE FROM events WHERE seen_at < ?", (now - EVENTS_KEPT,))
+            self._next_sweep = now + LEASE_SWEEP_INTERVAL
+
+    def _acquire(self, company: str, cafe: str, date_: str, ttl: float) -> bool:
+        now = time.time()
+        con = self._connect()
+        self._sweep(con, now)
+        cursor = con.execute(
+            "INSERT INTO leases VALUES (?, ?, ?, ?, ?) ON CONFLICT (company, cafe, date) DO UPDATE "
+            "SET owner = excluded.owner, expires_at = excluded.expires_at WHERE leases.expires_at < ?",
+            (company, cafe, date_, self.owner, now + ttl, now)
+        )
+        con.commit()
+        return cursor.rowcount == 1
+
+    def _leased(self, company: str, cafe: str, date_: str) -> bool:
+        return self._connect().execute(
+            "SELECT 1 FROM leases WHERE company = ? AND cafe = ? AND date = ? AND expires_at >= ?",
+            (company, cafe, date_, time.time())
+        ).fetchone() is not None
+
+    def _release(self, company: str, cafe: str, date_: str) -> None:
+        con = self._connect()
+        con.execute(
+            "DELETE FROM leases WHERE company = ? AND cafe = ? AND date = ? AND owner = ?",
+            (company, cafe, date_, self.owner)
+        )
+        con.commit()
+
+    def _record_event(self, event_id: str) -> bool:
+        now = time.time()
+        con = self._connect()
+        self._sweep(con, now)
+        cursor = con.execute("INSERT OR IGNORE INTO events VALUES (?, ?)", (event_id, now))
+        con.commit()
+        return cursor.rowcount == 1
+
+    def _subscribe(self, nickname: str, channel: str) -> bool:
+        con = self._connect()
+        cursor = con.execute("INSERT OR IGNORE INTO subscriptions VALUES (?, ?)", (nickname, channel))
+        con.commit()
+        return cursor.rowcount == 1
+
+    def _unsubscribe(self, nicknames: Tuple[str, ...], channel: str) -> int:
+        con = self._connect()
+        cursor = con.executemany(
+            "DELETE FROM subscriptions WHERE nickname = ? AND channel = ?", [(x, channel) for x in nicknames]
+        )
+        con.commit()
+        return cursor.rowcount
+
+    def _subscriptions(self) -> Dict[str, Set[str]]:
+        subscriptions: Dict[str, Set[str]] = {}
+        for (nickname, channel) in self._connect().execute("SELECT nickname, channel FROM subscriptions"):
+            subscriptions.setdefault(nickname, set()).add(channel)
+        return subscriptions
+
+    async def get(self, company: str, cafe: str, date_: str) -> Optional[Tuple[DailyMenu, float, Optional[float]]]:
+        """
+        Looks up a stored menu.
+        :param company: the café's company
+        :param cafe: the café's name
+        :param date_: str YYYY-MM-DD
+        :return: (menu items, unix time they were fetched at, unix time they're fresh until if they were stored to be
+            kept longer than usual), or None if the menu isn't stored
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._get, company, cafe, date_)
+
+    def put(self, company: str, cafe: str, date_: str, items: DailyMenu, fresh_for: Optional[float] = None) -> None:
+        """
+        Queues a menu to be written, without waiting for the write to happen.
+        :param company: the café's company
+        :param cafe: the café's name
+        :param date_: str YYYY-MM-DD
+        :param items: the parsed menu items
+        :param fresh_for: seconds the menu stays fresh for, if longer than usual for its date
+        """
+        now = time.time()
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._put, company, cafe, date_, items, now, now + fresh_for if fresh_for else None
+        )
+        self._pending.add(future)
+        future.add_done_callback(self._written)
+
+    def put_missing(self, company: str, cafe: str, date_: str) -> None:
+        """
+        Queues a record that the café has no menu for the date, without waiting for the write to happen.
+        :param company: the café's company
+        :param cafe: the café's name
+        :param date_: str YYYY-MM-DD
+        """
+        future = asyncio.get_running_loop().run_in_executor(
+            self._executor, self._put_missing, company, cafe, date_, time.time()
+        )
+        self._pending.add(future)
+        future.add_done_callback(self._written)
+
+    async def missing(self, company: str, cafe: str, date_: str) -> Optional[float]:
+        """
+        Looks up when the café was last found to have no menu for the date.
+        :param company: the café's company
+        :param cafe: the café's name
+        :param date_: str YYYY-MM-DD
+        :return: the unix time it was found to have none, or None if it wasn't (or its menu has since been stored)
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._missing, company, cafe, date_
+        )
+
+    async def acquire(self, company: str, cafe: str, date_: str, ttl: float) -> bool:
+        """
+        Takes the lease on fetching a menu, unless another worker holds it.
+        :param company: the café's company
+        :param cafe: the café's name
+        :param date_: str YYYY-MM-DD
+        :param ttl: seconds until the lease expires, if it isn't released before then
+        :return: whether the lease was taken
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._acquire, company, cafe, date_, ttl
+        )
+
+    async def leased(self, company: str, cafe: str, date_: str) -> bool:
+        """
+        Whether any worker holds the lease on fetching a menu.
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._leased, company, cafe, date_)
+
+    def release(self, company: str, cafe: str, date_: str) -> None:
+        """
+        Queues the lease on fetching a menu to be released. As writes happen in order, the menu stored by the lease's
+        holder is always written before the lease is released.
+        """
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._release, company, cafe, date_)
+        self._pending.add(future)
+        future.add_done_callback(self._written)
+
+    async def record_event(self, event_id: str) -> bool:
+        """
+        Records that a Slack event is being handled.
+        :param event_id: the event's id
+        :return: whether no worker had recorded the event already
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._record_event, event_id)
+
+    async def subscribe(self, nickname: str, channel: str) -> bool:
+        """
+        Subscribes a channel to a café's daily digest.
+        :param nickname: the café's nickname, as in the config
+        :param channel: the Slack channel ID
+        :return: whether the channel wasn't already subscribed
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._subscribe, nickname, channel)
+
+    async def unsubscribe(self, nicknames: Iterable[str], channel: str) -> int:
+        """
+        Unsubscribes a channel from cafés' daily digests.
+        :param nicknames: the cafés' nicknames, as in the config
+        :param channel: the Slack channel ID
+        :return: the number of subscriptions removed
+        """
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self._unsubscribe, tuple(nicknames), channel
+        )
+
+    async def subscriptions(self) -> Dict[str, Set[str]]:
+        """
+        :return: the channels subscribed to each café's daily digest, by the café's nickname
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._subscriptions)
+
+    def _written(self, future: asyncio.Future) -> None:
+        self._pending.discard(future)
+        if not future.cancelled() and (e := future.exception()) is not None:
+            logging.warning(f"unable to store menu: {e!r}")
+
+    async def close(self) -> None:
+        """
+        Waits for queued writes to finish, and closes the database.
+        """
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        if self._con is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._con.close)
+            self._con = None
+        self._executor.shutdown(wait=True)
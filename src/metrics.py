@@ -0,0 +1,226 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from functools import wraps
+from time import perf_counter
+from typing import Callable, Dict, List, Sequence, Tuple, Union
+
+# upper bounds, in seconds, suiting everything from rendering a menu (sub-millisecond) to fetching one (seconds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+Collected = Union[float, Dict[Tuple[str, ...], float]]
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{x}="{y}"' for (x, y) in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class HistogramChild:
+    """
+    Observations of one set of label values. Bucket counts are preallocated, so observing a value allocates nothing.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count", "sample_every", "_calls")
+
+    def __init__(self, bounds: Tuple[float, ...], sample_every: int):
+        self.bounds = bounds
+        # the last count is for values above the largest bound
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.sample_every = sample_every
+        self._calls = 0
+
+    def observe(self, value: float) -> None:
+        if self.sample_every > 1:
+            self._calls += 1
+            if self._calls % self.sample_every:
+                return
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def time(self, func: Callable) -> Callable:
+        """
+        Decorates a coroutine function, observing how long each call takes.
+        """
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                self.observe(perf_counter() - started)
+        return wrapper
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, help_: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_
+        self.label_names = tuple(labels)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """
+        The metric for the given label values. Hold on to the result where possible, rather than looking it up on
+        every call.
+        """
+        if (child := self._children.get(values)) is None:
+            child = self._children[values] = self._child()
+        return child
+
+    @abstractmethod
+    def _child(self):
+        ...
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        ...
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.label_names, x)} {y.value:g}" for (x, y) in self._children.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            help_: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+            sample_every: int = 1
+    ):
+        super().__init__(name, help_, labels)
+        self.buckets = tuple(sorted(buckets))
+        self.sample_every = sample_every
+
+    def _child(self) -> HistogramChild:
+        return HistogramChild(self.buckets, self.sample_every)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self, func: Callable) -> Callable:
+        return self.labels().time(func)
+
+    def samples(self) -> List[str]:
+        lines = []
+        for (values, child) in self._children.items():
+            cumulative = 0
+            for (bound, count) in zip((*self.buckets, "+Inf"), child.counts):
+                cumulative += count
+                le = bound if isinstance(bound, str) else f"{bound:g}"
+                labels = _labels(self.label_names, values, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {child.sum:g}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {child.count}")
+        return lines
+
+
+class Collector:
+    """
+    A metric whose values are read when the metrics are rendered, for state already tracked elsewhere (such as the
+    menu cache's hit counts).
+    """
+    def __init__(self, name: str, help_: str, kind: str, func: Callable[[], Collected], labels: Sequence[str] = ()):
+        """
+        :param kind: "counter" or "gauge"
+        :param func: returns the value, or the values by their label values when there are labels
+        """
+        self.name = name
+        self.help = help_
+        self.kind = kind
+        self.func = func
+        self.label_names = tuple(labels)
+
+    def samples(self) -> List[str]:
+        values = self.func()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels(self.label_names, x)} {float(y):g}" for (x, y) in values.items()]
+
+
+class Registry:
+    """
+    The bot's metrics, rendered in Prometheus' text format. Counters and histograms are updated in place on the hot
+    path; histograms can be sampled, observing only every nth call, to cut their cost further.
+    """
+    def __init__(self):
+        self.metrics: Dict[str, Union[_Metric, Collector]] = {}
+        self.sample_every = 1
+
+    def _register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_, labels))
+
+    def histogram(
+            self,
+            name: str,
+            help_: str,
+            labels: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_, labels, buckets, self.sample_every))
+
+    def collect(
+            self,
+            name: str,
+            help_: str,
+            kind: str,
+            func: Callable[[], Collected],
+            labels: Sequence[str] = ()
+    ) -> Collector:
+        return self._register(Collector(name, help_, kind, func, labels))
+
+    def configure(self, sample_every: int = 1) -> None:
+        """
+        :param sample_every: histograms observe one in this many calls, their counts being of the sampled calls only
+        """
+        self.sample_every = sample_every
+        for metric in self.metrics.values():
+            if isinstance(metric, Histogram):
+                metric.sample_every = sample_every
+                for child in metric._children.values():
+                    child.sample_every = sample_every
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Registry()
@@ -0,0 +1,103 @@
+import asyncio
+from datetime import datetime, time, timedelta, timezone
+import logging
+from random import uniform
+from typing import Dict, Iterable, Optional
+
+import aiohttp
+
+from src.breaker import CircuitOpenError
+from src.cafe_tasks import CafeTasks
+from src.get_menu import Cafe
+from src.router import week_dates
+
+
+def seconds_until(run_times: Iterable[time], utc_offset: int, now: Optional[datetime] = None) -> float:
+    """
+    Seconds until the next of the run times, in the local time of the café.
+    :param run_times: local times of day to run at
+    :param utc_offset: UTC offset for the time zone of the café in question
+    :param now: the current (timezone aware) time, defaults to now
+    """
+    local_now = (now or datetime.now(timezone.utc)).astimezone(timezone(timedelta(hours=utc_offset)))
+    candidates = [
+        datetime.combine(local_now.date() + timedelta(days=days), run_time, local_now.tzinfo)
+        for days in (0, 1) for run_time in run_times
+    ]
+    return min((x - local_now).total_seconds() for x in candidates if x > local_now)
+
+
+class Prefetcher(CafeTasks):
+    """
+    Warms the menu cache with the week's menus for every café, shortly after the café's local midnight and again
+    before the lunch rush, so that requests made during the day don't have to wait on the café's site. Prefetched menus
+    are kept until the next run, however briefly menus for their day would usually be cached.
+    """
+    def __init__(
+            self,
+            cafes: Dict[str, Cafe],
+            run_times: Iterable[str] = ("00:15", "10:30"),
+            jitter: float = 300,
+            concurrency: int = 4,
+            retries: int = 3,
+            backoff: float = 30
+    ):
+        """
+        :param cafes: cafés to prefetch, by nickname
+        :param run_times: local times of day, "HH:MM", to prefetch at
+        :param jitter: up to this many seconds are randomly added to each run, so cafés don't all fetch at once
+        :param concurrency: maximum number of menu fetches running at a time, across all cafés
+        :param retries: attempts to make at fetching a menu before giving up until the next run
+        :param backoff: seconds to wait before the first retry, doubled for each retry after that
+        """
+        super().__init__(cafes)
+        self.run_times = [time.fromisoformat(x) for x in run_times]
+        self.jitter = jitter
+        self.retries = retries
+        self.backoff = backoff
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(self, nickname: str, cafe: Cafe) -> None:
+        delay = 0.0
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.prefetch(cafe)
+            except Exception as e:
+                logging.exception(f"prefetch of {cafe.cafe_name} failed: {e!r}")
+            delay = seconds_until(self.run_times, cafe.utc_offset) + uniform(0, self.jitter)
+
+    async def prefetch(self, cafe: Cafe, now: Optional[datetime] = None) -> None:
+        """
+        Fetches Monday through Friday's menus for the café. Menus for days that have passed are only fetched if they
+        aren't already cached, as they won't change.
+        :param cafe: the café to prefetch
+        :param now: the current (timezone aware) time, defaults to now
+        """
+        today = cafe.today()
+        # the latest the next run can start
+        ttl = seconds_until(self.run_times, cafe.utc_offset, now) + self.jitter
+        await asyncio.gather(*[
+            self._fetch(cafe, date_.strftime("%Y-%m-%d"), ttl) for date_ in week_dates(today)
+            if date_ >= today or not cafe.cache.contains(cafe.base_url, date_.strftime("%Y-%m-%d"))
+        ])
+
+    async def _fetch(self, cafe: Cafe, date_: str, ttl: float) -> None:
+        for attempt in range(self.retries):
+            try:
+                async with self._semaphore:
+                    entry = await cafe.refresh(date_, ttl)
+                if not entry.changed:
+                    logging.debug(f"menu of {cafe.cafe_name} for {date_} is unchanged")
+                return
+            except LookupError:
+                # the café has no menu up for the day, which has been negatively cached
+                return
+            except CircuitOpenError:
+                # the café's site is down, it'll be tried again on the next run
+                logging.info(f"skipping prefetch of {cafe.cafe_name} for {date_}, its site is unavailable")
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"prefetch of {cafe.cafe_name} for {date_} failed: {e!r}")
+                if attempt + 1 < self.retries:
+                    await asyncio.sleep(self.backoff * 2 ** attempt + uniform(0, self.backoff))
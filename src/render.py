@@ -0,0 +1,51 @@
+from typing import Dict, Optional, Tuple
+
+from src.menu_model import DailyMenu
+
+COR_ICONS = {
+    "1": "[V]",
+    "3": "[SW]",
+    "4": "[Ve]",
+    "6": "[FF]",
+    "9": "[GF]"
+}
+# the dietary icon codes an item needs (any of) to be included in a filtered render
+DIETARY_FILTERS = {
+    "vegan": frozenset({"4"}),
+    "vegetarian": frozenset({"1", "4"}),
+    "gluten-free": frozenset({"9"}),
+}
+# the formats a menu can be rendered in, see `render`
+FORMATS = ("text", "compact")
+
+# rendered icons for each combination of icon codes, menu items share their combination's tuple so this stays small
+_ICON_TEXT: Dict[Tuple[str, ...], str] = {}
+
+
+def icons_text(cor_icons: Tuple[str, ...]) -> str:
+    if (text := _ICON_TEXT.get(cor_icons)) is None:
+        text = _ICON_TEXT[cor_icons] = "".join(COR_ICONS.get(x, "") for x in cor_icons)
+    return text
+
+
+def render(menu: DailyMenu, fmt: str = "text", dietary: Optional[str] = None) -> str:
+    """
+    Renders a day's menu as Slack mrkdwn.
+    :param menu: the day's menu items
+    :param fmt: "text" for a line per item with its description, or "compact" for just the item names on one line
+    :param dietary: only include items matching this key of `DIETARY_FILTERS`
+    :raises ValueError: if the format isn't one of `FORMATS`
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown menu format {fmt!r}, expected one of {', '.join(FORMATS)}")
+    items = menu.items
+    if dietary is not None:
+        codes = DIETARY_FILTERS[dietary]
+        items = [x for x in items if not codes.isdisjoint(x.cor_icons)]
+        if not items:
+            return f"No {dietary} items on the menu."
+    if fmt == "compact":
+        return ", ".join(f"{x.label.title()} {icons_text(x.cor_icons)}".rstrip() for x in items)
+    return "\n".join([
+        f"  • *{x.label.title()}* {icons_text(x.cor_icons)}: {x.description.capitalize()}." for x in items
+    ])
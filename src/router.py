@@ -0,0 +1,140 @@
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.search import tokenize
+
+WEEK_DAYS = ('MONDAY', 'TUESDAY', 'WEDNESDAY', 'THURSDAY', 'FRIDAY')
+RELATIVE_DAYS = ('TODAY', 'TOMORROW', 'YESTERDAY')
+MEAL_TYPES = ("LUNCH", "DINNER")
+ACTIONS = ("HELP", "WHERE", "WHEN", "SUBSCRIBE", "UNSUBSCRIBE")
+# actions that search the menus for whatever follows them in the message
+SEARCH_ACTIONS = ("where", "when")
+# actions that subscribe the channel to, or unsubscribe it from, the daily digest of the cafés named in the message
+SUBSCRIPTION_ACTIONS = ("subscribe", "unsubscribe")
+DIETARY = {"VEGAN": "vegan", "VEGETARIAN": "vegetarian", "GLUTEN-FREE": "gluten-free", "GF": "gluten-free"}
+# when a message names more than one day, the first of these wins
+DAY_PRIORITY = RELATIVE_DAYS + WEEK_DAYS + ("WEEK",)
+
+
+def week_dates(today: date) -> List[date]:
+    """
+    Monday through Friday of the current week, or of the coming week if today is on the weekend.
+    :param today: the local date of the café
+    """
+    if (week_day := today.weekday()) in {5, 6}:
+        week_start = today + timedelta(days=7 - week_day)
+    else:
+        week_start = today - timedelta(days=week_day)
+    return [week_start + timedelta(days=x) for x in range(5)]
+
+
+@lru_cache(maxsize=32)
+def day_table(today: date) -> Dict[str, Tuple[date, ...]]:
+    """
+    The dates each day word refers to, for a café whose local date is `today`.
+    :param today: the local date of the café
+    """
+    week = tuple(week_dates(today))
+    return {
+        'TODAY': (today,),
+        'TOMORROW': (today + timedelta(days=1),),
+        'YESTERDAY': (today - timedelta(days=1),),
+        **{x: (y,) for (x, y) in zip(WEEK_DAYS, week)},
+        'WEEK': week,
+    }
+
+
+class Command(NamedTuple):
+    action: Optional[str]
+    cafe: str
+    meal: Optional[str]
+    dates: Optional[Tuple[date, ...]]
+    dietary: Optional[str] = None
+    # nicknames of every café to get the menu from, when the message asks for all cafés or a group of them
+    fan_out: Optional[Tuple[str, ...]] = None
+    # the words to search the menus for, tokenized as the index does, for the search actions
+    query: Optional[str] = None
+
+    @property
+    def is_search(self) -> bool:
+        """
+        Whether the message searches the menus. A search action with nothing to search for but a meal, as in "where is
+        lunch today?", asks for the menu instead.
+        """
+        return self.action in SEARCH_ACTIONS and bool(self.query or self.meal is None)
+
+
+class Router:
+    """
+    Parses a Slack message into a command in a single pass, using one compiled pattern of every keyword the bot
+    understands: café nicknames and groups, meal types, day words, dietary filters and actions.
+    """
+    def __init__(self, cafes: Dict[str, dict], groups: Optional[Dict[str, List[str]]] = None):
+        """
+        :param cafes: the configured cafés, as in `CONFIG["cafes"]`
+        :param groups: named groups of café nicknames, as in `CONFIG["cafe_groups"]`
+        """
+        self.utc_offsets = {x.upper(): y["utc_offset"] for (x, y) in cafes.items()}
+        self.nicknames = {x.upper(): x for x in cafes}
+        self.groups = {"ALL": tuple(cafes), **{x.upper(): tuple(y) for (x, y) in (groups or {}).items()}}
+        self.keywords: Dict[str, str] = {
+            **{x: "cafe" for x in self.nicknames},
+            **{x: "group" for x in self.groups},
+            **{x: "action" for x in ACTIONS},
+            **{x: "day" for x in DAY_PRIORITY},
+            **{x: "meal" for x in MEAL_TYPES},
+            **{x: "dietary" for x in DIETARY},
+        }
+        self.pattern = re.compile(
+            r"(?<![\w-])(" + "|".join(map(re.escape, sorted(self.keywords, key=len, reverse=True))) + r")(?![\w-])",
+            re.IGNORECASE
+        )
+
+    def parse(self, text: str, now: Optional[datetime] = None) -> Command:
+        """
+        :param text: the Slack message to parse
+        :param now: the current (timezone aware) time, defaults to now
+        :return: the requested action, café (the default if the message doesn't name one), meal, dates, and dietary
+            filter. If the message ends with the meal (or the meal followed by cafés or dietary filters, as in "lunch
+            all"), the dates are today's. If no day is given otherwise, the dates are None.
+        """
+        action = cafe = meal = dietary = group = query = None
+        action_end = 0
+        days = set()
+        # end of the meal and any cafés, groups or dietary filters straight after it
+        meal_end = None
+        stripped = text.rstrip()
+        for match in self.pattern.finditer(text):
+            word = match.group(1).upper()
+            kind = self.keywords[word]
+            if kind == "meal":
+                meal_end = match.end()
+            elif kind in {"cafe", "group", "dietary"} and meal_end is not None:
+                meal_end = match.end() if not text[meal_end:match.start()].strip(" ,") else None
+            else:
+                meal_end = None
+            if kind == "cafe":
+                cafe = cafe or word
+            elif kind == "meal":
+                meal = meal or word.lower()
+            elif kind == "day":
+                days.add(word)
+            elif kind == "dietary":
+                dietary = dietary or DIETARY[word]
+            elif kind == "group":
+                group = group or word
+            elif action is None:
+                action = word.lower()
+                action_end = match.end()
+        cafe = self.nicknames.get(cafe) or "default"
+        today = ((now or datetime.now(timezone.utc)) + timedelta(hours=self.utc_offsets[cafe.upper()])).date()
+        if meal_end == len(stripped):
+            dates = (today,)
+        else:
+            dates = next((day_table(today)[x] for x in DAY_PRIORITY if x in days), None)
+        if action in SEARCH_ACTIONS:
+            # the words searched for, as the index sees them, so replies don't echo back words like "is" or "this"
+            query = " ".join(tokenize(self.pattern.sub(" ", text[action_end:])))
+        return Command(action, cafe, meal, dates, dietary, self.groups.get(group), query)
@@ -0,0 +1,136 @@
+from collections import defaultdict
+import re
+from typing import DefaultDict, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+import unicodedata
+
+from src.menu_model import DailyMenu, MenuItem
+
+_WORD = re.compile(r"[a-z0-9]+")
+STOP_WORDS = frozenset({
+    "a", "an", "and", "any", "are", "at", "for", "is", "next", "of", "on", "the", "there", "this", "with",
+})
+
+# (café, date, position of the item in the day's menu)
+Posting = Tuple[str, str, int]
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lower cases, strips accents, drops stop words, and folds simple plurals, so "Gyros" and "gyro" match.
+    :param text: the text to tokenize
+    """
+    text = unicodedata.normalize("NFKD", text.lower()).encode("ascii", "ignore").decode()
+    return [
+        x[:-1] if len(x) > 3 and x.endswith("s") and not x.endswith("ss") else x
+        for x in _WORD.findall(text) if x not in STOP_WORDS
+    ]
+
+
+class Hit(NamedTuple):
+    cafe: str
+    date: str
+    item: MenuItem
+
+
+class MenuIndex:
+    """
+    In-memory inverted index over the labels and descriptions of every menu that has been fetched, so that questions
+    like "where is ramen this week" are answered without going back to the cafés' sites. Updated incrementally as
+    each day's menu arrives, replacing whatever was indexed for that café and day.
+    """
+    def __init__(self, names: Optional[Dict[str, str]] = None, max_days: int = 60):
+        """
+        :param names: display names of the cafés, by base url
+        :param max_days: number of distinct dates kept, the oldest are dropped beyond this
+        """
+        self.names = names if names is not None else {}
+        self.max_days = max_days
+        self._menus: Dict[Tuple[str, str], DailyMenu] = {}
+        self._postings: DefaultDict[str, Set[Posting]] = defaultdict(set)
+        self._facets: DefaultDict[str, Set[Posting]] = defaultdict(set)
+
+    def __len__(self):
+        return len(self._menus)
+
+    def update(self, base_url: str, date_: str, menu: DailyMenu) -> None:
+        """
+        Indexes a café's menu for the day, replacing any earlier version of it.
+        :param base_url: the café's base url
+        :param date_: str YYYY-MM-DD
+        :param menu: the day's menu
+        """
+        cafe = self.names.get(base_url, base_url)
+        self._remove(cafe, date_)
+        self._menus[(cafe, date_)] = menu
+        for (position, item) in enumerate(menu):
+            posting = (cafe, date_, position)
+            for token in set(tokenize(f"{item.label} {item.description}")):
+                self._postings[token].add(posting)
+            for code in item.cor_icons:
+                self._facets[code].add(posting)
+        self._trim()
+
+    def _remove(self, cafe: str, date_: str) -> None:
+        if (menu := self._menus.pop((cafe, date_), None)) is None:
+            return
+        for (position, item) in enumerate(menu):
+            posting = (cafe, date_, position)
+            for index, keys in ((self._postings, tokenize(f"{item.label} {item.description}")),
+                                (self._facets, item.cor_icons)):
+                for key in keys:
+                    if (postings := index.get(key)) is not None:
+                        postings.discard(posting)
+                        if not postings:
+                            del index[key]
+
+    def drop(self, cafe: str) -> None:
+        """
+        Removes every menu indexed for the café, such as once it's been removed from the config.
+        :param cafe: the café's display name
+        """
+        for (_, date_) in [x for x in self._menus if x[0] == cafe]:
+            self._remove(cafe, date_)
+
+    def _trim(self) -> None:
+        dates = sorted({x for (_, x) in self._menus})
+        for date_ in dates[:max(0, len(dates) - self.max_days)]:
+            for (cafe, _) in [x for x in self._menus if x[1] == date_]:
+                self._remove(cafe, date_)
+
+    def search(
+            self,
+            query: str,
+            start: Optional[str] = None,
+            end: Optional[str] = None,
+            cor_icons: Iterable[str] = ()
+    ) -> List[Hit]:
+        """
+        Finds the menu items matching every word of the query.
+        :param query: e.g. "ramen"
+        :param start: earliest date to include, str YYYY-MM-DD
+        :param end: latest date to include, str YYYY-MM-DD
+        :param cor_icons: only include items with any of these dietary icon codes
+        :return: the matching items, ordered by date then café
+        """
+        if not (tokens := tokenize(query)):
+            return []
+        postings = set.intersection(*(self._postings.get(x, set()) for x in tokens))
+        if codes := frozenset(cor_icons):
+            postings &= set().union(*(self._facets.get(x, set()) for x in codes))
+        hits = [
+            Hit(cafe, date_, self._menus[(cafe, date_)].items[position])
+            for (cafe, date_, position) in postings
+            if (start is None or date_ >= start) and (end is None or date_ <= end)
+        ]
+        return sorted(hits, key=lambda x: (x.date, x.cafe, x.item.label))
+
+    def next(self, query: str, start: str, cor_icons: Iterable[str] = ()) -> List[Hit]:
+        """
+        Finds the first date, on or after `start`, that any café serves something matching the query.
+        :param query: e.g. "gyro"
+        :param start: str YYYY-MM-DD
+        :param cor_icons: only include items with any of these dietary icon codes
+        :return: the matching items on that date
+        """
+        hits = self.search(query, start=start, cor_icons=cor_icons)
+        return [x for x in hits if x.date == hits[0].date] if hits else []
@@ -0,0 +1,101 @@
+from typing import Optional
+
+import aiohttp
+
+
+class SessionPool:
+    """
+    A single process-wide aiohttp session, so that every café (and the Slack client) shares one connection pool,
+    DNS cache and set of kept-alive TLS connections, rather than each building their own.
+    """
+    def __init__(
+            self,
+            limit: int = 100,
+            limit_per_host: int = 8,
+            keepalive_timeout: float = 30,
+            ttl_dns_cache: int = 300,
+            total_timeout: float = 30,
+            connect_timeout: float = 5,
+            compress: bool = True
+    ):
+        """
+        :param limit: maximum number of open connections
+        :param limit_per_host: maximum number of open connections to a single host
+        :param keepalive_timeout: seconds an idle connection is kept open for reuse
+        :param ttl_dns_cache: seconds DNS lookups are cached for
+        :param total_timeout: seconds a request may take in total
+        :param connect_timeout: seconds acquiring a connection may take
+        :param compress: whether to ask for gzip/deflate compressed responses
+        """
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self.compress = compress
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.requests = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.dns_cache_hits = 0
+        self.dns_cache_misses = 0
+
+    async def open(self) -> aiohttp.ClientSession:
+        """
+        Returns the shared session, creating it on first use. Must be called from within the running event loop.
+        """
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache,
+            )
+            self.session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={"Accept-Encoding": "gzip, deflate" if self.compress else "identity"},
+                trace_configs=[self._trace_config()],
+            )
+        return self.session
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(*_):
+            self.requests += 1
+
+        async def on_connection_create_end(*_):
+            self.connections_created += 1
+
+        async def on_connection_reuseconn(*_):
+            self.connections_reused += 1
+
+        async def on_dns_cache_hit(*_):
+            self.dns_cache_hits += 1
+
+        async def on_dns_cache_miss(*_):
+            self.dns_cache_misses += 1
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+        trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_cache_miss)
+        return trace_config
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "dns_cache_hits": self.dns_cache_hits,
+            "dns_cache_misses": self.dns_cache_misses,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+        }
@@ -0,0 +1,46 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key, so that only one of them does the work and every caller awaits the
+    same result (or exception).
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[Hashable, int] = {}
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Runs `func` for the key, unless a call for the key is already running, in which case its result is awaited
+        instead. A caller being cancelled doesn't cancel the shared call unless it was the last one waiting on it.
+        :param key: the key identifying the work, e.g. (base_url, date)
+        :param func: coroutine function doing the work
+        """
+        if (task := self._calls.get(key)) is None:
+            task = asyncio.ensure_future(func())
+            self._calls[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda _: self._forget(key, task))
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            if key in self._waiters and self._calls.get(key) is task:
+                self._waiters[key] -= 1
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+            del self._waiters[key]
+        if not task.cancelled():
+            # retrieved here so an exception nobody awaited (all callers cancelled) isn't logged as never retrieved
+            task.exception()
@@ -0,0 +1,211 @@
+import asyncio
+from itertools import count
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+from src.metrics import METRICS
+
+# (requests per second, burst) for Slack's rate limit tiers, see https://api.slack.com/docs/rate-limits
+TIERS = {
+    1: (1 / 60, 1),
+    2: (20 / 60, 3),
+    3: (50 / 60, 5),
+    4: (100 / 60, 10),
+}
+# chat.postMessage has its own limit of about one message per second per channel, allowing short bursts, and several
+# hundred a minute across the workspace
+POST_MESSAGE_RATE = (1.0, 3)
+POST_MESSAGE_WORKSPACE_RATE = (300 / 60, 20)
+METHOD_TIERS = {
+    "chat_update": 3,
+    "conversations_info": 3,
+    "users_info": 4,
+}
+
+# thread replies go before new messages, as their parent has already been posted and they complete it
+PRIORITY_REPLY = 0
+PRIORITY_MESSAGE = 1
+
+CALL_SECONDS = METRICS.histogram("benbot_slack_call_seconds", "Time spent waiting on Slack API calls", ("method",))
+QUEUED_SECONDS = METRICS.histogram(
+    "benbot_slack_queued_seconds", "Time Slack API calls waited in the outbound queue before being sent"
+)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        """
+        :param rate: tokens added per second
+        :param burst: maximum number of tokens held
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self) -> float:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        return now
+
+    def wait(self) -> float:
+        """
+        How many seconds until a token can be taken, without taking one.
+        """
+        now = self._refill()
+        wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+        return max(wait, self.blocked_until - now)
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def block(self, seconds: float) -> None:
+        """
+        Stops tokens being used for the next `seconds`, such as after Slack responds with a Retry-After.
+        """
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class SlackPoster:
+    """
+    Queues outbound Slack API calls, sending them as fast as Slack's rate limits allow. Each method has a token bucket
+    matched to its rate tier (chat.postMessage is also limited per channel), rate limited calls are retried after the
+    Retry-After Slack asks for, and thread replies are sent ahead of new messages. A call whose buckets are empty is
+    put back in the queue once they've refilled, rather than holding up a worker, so a busy channel doesn't delay
+    posts to the others.
+    """
+    def __init__(
+            self,
+            client: Optional[AsyncWebClient],
+            workers: int = 4,
+            max_retries: int = 3,
+            rate_limit: bool = True
+    ):
+        """
+        :param client: the Slack client to call, which can be set (or replaced) any time before calls are made
+        :param workers: number of calls made at once
+        :param max_retries: attempts at a rate limited call before giving up on it
+        :param rate_limit: pace calls to Slack's rate limits, only worth turning off against a fake Slack
+        """
+        self.client = client
+        self.workers = workers
+        self.max_retries = max_retries
+        self.rate_limit = rate_limit
+        self._queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        self._order = count()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._tasks: List[asyncio.Task] = []
+        # calls waiting on their buckets to refill, to be put back in the queue
+        self._deferred: Set[asyncio.TimerHandle] = set()
+        self.dispatched = 0
+        self.sent = 0
+        self.rate_limited = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for handle in self._deferred:
+            handle.cancel()
+        self._deferred.clear()
+
+    async def call(self, method: str, priority: Optional[int] = None, **kwargs):
+        """
+        Queues a Slack API call, and waits for its response.
+        :param method: the AsyncWebClient method, e.g. "chat_postMessage"
+        :param priority: lower is sent first, defaults to PRIORITY_REPLY for thread replies else PRIORITY_MESSAGE
+        :param kwargs: the method's arguments
+        """
+        if priority is None:
+            priority = PRIORITY_REPLY if kwargs.get("thread_ts") else PRIORITY_MESSAGE
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._order), time.monotonic(), 0, method, kwargs, future))
+        return await future
+
+    async def post_message(self, **kwargs):
+        return await self.call("chat_postMessage", **kwargs)
+
+    def _bucket(self, key: str, rate: Tuple[float, int]) -> TokenBucket:
+        if (bucket := self._buckets.get(key)) is None:
+            bucket = self._buckets[key] = TokenBucket(*rate)
+        return bucket
+
+    def _buckets_for(self, method: str, kwargs: dict) -> List[TokenBucket]:
+        if method == "chat_postMessage":
+            return [
+                self._bucket(method, POST_MESSAGE_WORKSPACE_RATE),
+                self._bucket(f"{method}:{kwargs.get('channel')}", POST_MESSAGE_RATE),
+            ]
+        return [self._bucket(method, TIERS[METHOD_TIERS.get(method, 3)])]
+
+    def _defer(self, delay: float, item: tuple) -> None:
+        def requeue():
+            self._deferred.discard(handle)
+            self._queue.put_nowait(item)
+
+        handle = asyncio.get_running_loop().call_later(delay, requeue)
+        self._deferred.add(handle)
+
+    async def _work(self) -> None:
+        while True:
+            item = await self._queue.get()
+            priority, order, queued_at, attempt, method, kwargs, future = item
+            if future.done():
+                continue
+            buckets = self._buckets_for(method, kwargs) if self.rate_limit else []
+            if buckets and (delay := max(x.wait() for x in buckets)) > 0:
+                # keeps its place in the queue once it's back, and no tokens are taken until it's sent
+                self._defer(delay, item)
+                continue
+            for bucket in buckets:
+                bucket.take()
+            self.dispatched += 1
+            self.wait_time_total += (wait := time.monotonic() - queued_at)
+            self.wait_time_max = max(self.wait_time_max, wait)
+            QUEUED_SECONDS.observe(wait)
+            started = time.monotonic()
+            try:
+                response = await getattr(self.client, method)(**kwargs)
+            except SlackApiError as e:
+                if e.response.status_code == 429 and attempt + 1 < self.max_retries:
+                    self.rate_limited += 1
+                    retry_after = float(e.response.headers.get("Retry-After", 1))
+                    logging.warning(f"{method} rate limited, retrying in {retry_after}s")
+                    for bucket in buckets:
+                        bucket.block(retry_after)
+                    # keeps its place in the queue, ahead of anything queued after it
+                    self._queue.put_nowait((priority, order, queued_at, attempt + 1, method, kwargs, future))
+                elif not future.done():
+                    future.set_exception(e)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                self.sent += 1
+                if not future.done():
+                    future.set_result(response)
+            finally:
+                # failed and rate limited calls too, as they also held up the queue
+                CALL_SECONDS.labels(method).observe(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize() + len(self._deferred),
+            "sent": self.sent,
+            "rate_limited": self.rate_limited,
+            "wait_time_avg": self.wait_time_total / self.dispatched if self.dispatched else 0.0,
+            "wait_time_max": self.wait_time_max,
+        }
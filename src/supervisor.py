@@ -0,0 +1,128 @@
+import asyncio
+from collections import deque
+import logging
+import time
+from typing import Awaitable, Callable, Deque, Dict, List, Tuple
+
+Job = Callable[[], Awaitable]
+
+
+class TaskSupervisor:
+    """
+    Runs fire-and-forget handlers (such as posting a menu) on a fixed pool of workers. Work is queued per channel and
+    the workers take turns between channels, so one busy channel can't starve the rest. When the queue is full new
+    work is refused rather than piling up, so memory use and latency stay bounded.
+    """
+    def __init__(self, workers: int = 8, max_queue: int = 100, max_per_channel: int = 10):
+        """
+        :param workers: number of handlers run at once
+        :param max_queue: maximum number of handlers waiting to run, across all channels
+        :param max_per_channel: maximum number of handlers waiting to run for a single channel
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_per_channel = max_per_channel
+        self._queues: Dict[str, Deque[Tuple[float, Job]]] = {}
+        # channels with queued work, in the order the workers will next serve them
+        self._ready: Deque[str] = deque()
+        self._queued = 0
+        # counts queued handlers, so idle workers wait until there's something to run
+        self._items = asyncio.Semaphore(0)
+        self._tasks: List[asyncio.Task] = []
+        self._accepting = False
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.run_time_total = 0.0
+        self.run_time_max = 0.0
+
+    def start(self) -> None:
+        self._accepting = True
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    def submit(self, channel: str, job: Job) -> bool:
+        """
+        Queues a handler to be run.
+        :param channel: the Slack channel the handler is for
+        :param job: coroutine function to run
+        :return: whether the handler was queued, False if the supervisor is saturated (or shutting down)
+        """
+        queue = self._queues.get(channel)
+        if (
+                not self._accepting
+                or self._queued >= self.max_queue
+                or (queue is not None and len(queue) >= self.max_per_channel)
+        ):
+            self.rejected += 1
+            return False
+        if queue is None:
+            queue = self._queues[channel] = deque()
+            self._ready.append(channel)
+        queue.append((time.monotonic(), job))
+        self._queued += 1
+        self._items.release()
+        return True
+
+    def _next(self) -> Tuple[float, Job]:
+        channel = self._ready.popleft()
+        queue = self._queues[channel]
+        queued_at, job = queue.popleft()
+        if queue:
+            self._ready.append(channel)
+        else:
+            del self._queues[channel]
+        self._queued -= 1
+        return queued_at, job
+
+    async def _work(self) -> None:
+        while True:
+            await self._items.acquire()
+            queued_at, job = self._next()
+            started = time.monotonic()
+            self.wait_time_total += (wait := started - queued_at)
+            self.wait_time_max = max(self.wait_time_max, wait)
+            self.running += 1
+            try:
+                await job()
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                logging.exception(f"background task failed: {e!r}")
+            finally:
+                self.running -= 1
+                self.run_time_total += (run := time.monotonic() - started)
+                self.run_time_max = max(self.run_time_max, run)
+
+    async def drain(self, timeout: float = 30) -> None:
+        """
+        Stops accepting work, and waits up to `timeout` seconds for queued and running handlers to finish before
+        cancelling whatever is left.
+        :param timeout: seconds to wait
+        """
+        self._accepting = False
+        deadline = time.monotonic() + timeout
+        while (self._queued or self.running) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        started = self.completed + self.failed + self.running
+        return {
+            "queued": self._queued,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "wait_time_avg": self.wait_time_total / started if started else 0.0,
+            "wait_time_max": self.wait_time_max,
+            "run_time_avg": self.run_time_total / (self.completed + self.failed or 1),
+            "run_time_max": self.run_time_max,
+        }
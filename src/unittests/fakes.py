@@ -0,0 +1,54 @@
+import asyncio
+from datetime import date
+from typing import Optional
+
+import aiohttp
+
+from src.get_menu import Cafe
+from src.menu_model import DailyMenu
+
+# what a fake café's page has on it, unless it's given something else
+ITEMS = {
+    "1": {"label": "gyros", "description": "pita, cucumber dill sauce", "cor_icon": {"9": "Gluten Free"}},
+}
+
+
+class FakeCafe(Cafe):
+    """
+    A café whose menu comes from memory rather than its site, counting how many times it's fetched.
+    """
+    def __init__(
+            self,
+            company: str = "company",
+            cafe_name: str = "cafe",
+            *args,
+            items: Optional[dict] = ITEMS,
+            delay: float = 0,
+            failures: int = 0,
+            today: Optional[date] = None,
+            **kwargs
+    ):
+        """
+        :param items: the menu items, as on the café's page, served for every date. None for the café to have no menu
+        :param delay: seconds each fetch takes
+        :param failures: number of fetches that fail to connect, before the rest succeed
+        :param today: the café's local date, defaults to the actual date
+        """
+        super().__init__(company, cafe_name, *args, **kwargs)
+        self.items = items
+        self.delay = delay
+        self.failures = failures
+        self._today = today
+
+    def today(self) -> date:
+        return self._today or super().today()
+
+    async def get_menu_items(self, date_: str) -> DailyMenu:
+        self.fetches += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.fetches <= self.failures:
+            raise aiohttp.ClientConnectionError("unreachable")
+        if self.items is None:
+            raise LookupError
+        return DailyMenu.from_bamco(self.items)
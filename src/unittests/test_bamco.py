@@ -0,0 +1,53 @@
+import json
+import os
+import sys
+import unittest
+
+from src.bamco import extract_bytes
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "cafe_page.html")
+
+
+class TestBamco(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, "rb") as f:
+            cls.body = f.read()
+
+    def legacy_menu_items(self) -> dict:
+        for line in self.body.decode().splitlines():
+            if "Bamco.menu_items" in line:
+                return json.loads(line.split("= ")[1][:-1])
+
+    def test_menu_items_match_full_page_scan(self):
+        expected = self.legacy_menu_items()
+        for chunk_size in (None, 1024, 7, 1):
+            self.assertEqual(expected, extract_bytes(self.body, chunk_size).menu_items, chunk_size)
+
+    def test_dayparts_and_stations(self):
+        page = extract_bytes(self.body, 4096)
+        self.assertEqual(set(page.dayparts), {"1", "3"})
+        self.assertEqual(page.dayparts["3"]["label"], "Lunch")
+        self.assertIn("@grill", {x["label"] for x in page.stations.values()})
+        self.assertIn("9", page.cor_icons)
+
+    def test_digest(self):
+        self.assertEqual(extract_bytes(self.body).digest, extract_bytes(self.body, 1024).digest)
+        changed = self.body.replace(b"Bamco.menu_items = {", b'Bamco.menu_items = {"0": {}, ', 1)
+        self.assertNotEqual(extract_bytes(self.body).digest, extract_bytes(changed).digest)
+
+    def test_missing_menu_items(self):
+        page = extract_bytes(b"<html><body>Closed today</body></html>")
+        with self.assertRaises(LookupError):
+            page.menu_items
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestBamco)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
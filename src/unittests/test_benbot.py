@@ -133,9 +133,138 @@ class TestBenbot(unittest.TestCase):
         self.assertIn(datetime.datetime(2019, 6, 18, 0, 0), test_result[1])
 
 
+class FakeSpreadsheet:
+    """
+    Stands in for a pygsheets Spreadsheet, with only the parts benbot5 uses.
+    """
+    def __init__(self, **worksheets):
+        self.worksheets = {x: FakeWorksheet(self, y) for (x, y) in worksheets.items()}
+        self.updated = "2019-06-17T00:00:00.000Z"
+        self.edits = 0
+        self.lookups = 0
+
+    def touch(self):
+        self.edits += 1
+        self.updated = f"2019-06-17T00:00:{self.edits:02d}.000Z"
+
+    def worksheet_by_title(self, title):
+        self.lookups += 1
+        return self.worksheets[title]
+
+
+class FakeWorksheet:
+    """
+    Stands in for a pygsheets Worksheet, counting the rows it returns.
+    """
+    def __init__(self, spreadsheet, values):
+        self.spreadsheet = spreadsheet
+        self.values = [list(x) for x in values]
+        self.rows_fetched = 0
+
+    @property
+    def rows(self):
+        # the sheet's grid, which (as a new sheet's does) has empty rows beyond those with values
+        return max(len(self.values), 1000)
+
+    def refresh(self, **_):
+        pass
+
+    def get_all_values(self, **_):
+        self.rows_fetched += len(self.values)
+        return [list(x) for x in self.values]
+
+    def get_values(self, start, end, **_):
+        # as pygsheets' GridRange does, a range missing a row number at either end covers the whole columns
+        if start[0] is None or end[0] is None:
+            start, end = (1, start[1]), (len(self.values), end[1])
+        rows = [list(x)[start[1] - 1:end[1]] for x in self.values[start[0] - 1:end[0]]]
+        self.rows_fetched += len(rows)
+        return rows
+
+    def append_table(self, values):
+        self.values.append([str(x) for x in values])
+        self.spreadsheet.touch()
+
+
+class TestSheetSync(unittest.TestCase):
+
+    def setUp(self):
+        self.sheet = FakeSpreadsheet(
+            lunch=[
+                ['year', 'week', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday'],
+                ['2019', '24', 'gyros', 'burgers', 'ramen', 'tacos', 'pizza'],
+                ['2019', '25', 'salad', 'soup'],
+            ],
+            dinner=[['year', 'week', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday']],
+        )
+        benbot5.spreadsheet = lambda: self.sheet
+        benbot5.worksheet.cache_clear()
+        benbot5.sync_state['updated'] = None
+        benbot5.sync_db(full=True)
+
+    def week(self, year, week):
+        benbot5.cursor.execute('SELECT * FROM lunch WHERE (week = ? AND year = ?)', (week, year))
+        return benbot5.cursor.fetchall()
+
+    def test_full_sync(self):
+        self.assertEqual(self.week(2019, 24), [(2019, 24, 'gyros', 'burgers', 'ramen', 'tacos', 'pizza')])
+        # trailing empty cells aren't returned by the Sheet
+        self.assertEqual(self.week(2019, 25), [(2019, 25, 'salad', 'soup', '', '', '')])
+
+    def test_unchanged_sheet_not_fetched(self):
+        fetched = self.sheet.worksheets['lunch'].rows_fetched
+        benbot5.sync_db()
+        self.assertEqual(self.sheet.worksheets['lunch'].rows_fetched, fetched)
+
+    def test_incremental_sync_fetches_new_rows_only(self):
+        lunch = self.sheet.worksheets['lunch']
+        lunch.values.append(['2019', '26', 'curry'])
+        self.sheet.touch()
+        fetched = lunch.rows_fetched
+        benbot5.sync_db()
+        self.assertEqual(lunch.rows_fetched - fetched, 1)
+        self.assertEqual(self.week(2019, 26), [(2019, 26, 'curry', '', '', '', '')])
+
+    def test_sync_command(self):
+        lunch = self.sheet.worksheets['lunch']
+        lunch.values.append(['2019', '26', 'curry'])
+        self.sheet.touch()
+        fetched = lunch.rows_fetched
+        benbot5.route('<@U123> sync-db')(channel='C123', text='<@U123> sync-db', web_client=None)
+        self.assertEqual(lunch.rows_fetched - fetched, 1)
+        # a full sync picks up rows edited in place
+        lunch.values[1][2] = 'falafel'
+        benbot5.route('<@U123> sync-db full')(channel='C123', text='<@U123> sync-db full', web_client=None)
+        self.assertEqual(self.week(2019, 24)[0][2], 'falafel')
+
+    def test_menus_asked_for_sync_when_due(self):
+        lunch = self.sheet.worksheets['lunch']
+        lunch.values.append(['2019', '26', 'curry'])
+        self.sheet.touch()
+        benbot5.sync_if_due()
+        self.assertEqual(self.week(2019, 26), [])
+        benbot5.sync_state['checked'] -= benbot5.SYNC_INTERVAL
+        benbot5.sync_if_due()
+        self.assertEqual(self.week(2019, 26), [(2019, 26, 'curry', '', '', '', '')])
+
+    def test_append_writes_through(self):
+        benbot5.append_menu_to_g_sheet(['pho', 'banh mi', '', '', ''], 'lunch', 25, 2019)
+        # the re-added week replaces the earlier one, without a sync
+        self.assertEqual(self.week(2019, 25), [(2019, 25, 'pho', 'banh mi', '', '', '')])
+        benbot5.sync_db()
+        self.assertEqual(self.week(2019, 25), [(2019, 25, 'pho', 'banh mi', '', '', '')])
+        # worksheet handles are looked up once each
+        self.assertEqual(self.sheet.lookups, 2)
+
+    def test_week_lookup_uses_primary_key(self):
+        benbot5.cursor.execute('EXPLAIN QUERY PLAN SELECT * FROM lunch WHERE (week = ? AND year = ?)', (24, 2019))
+        self.assertIn('USING INDEX', " ".join(str(x) for x in benbot5.cursor.fetchall()))
+
+
 def suite():
     functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestBenbot)
-    return unittest.TestSuite([functions_suite])
+    sync_suite = unittest.TestLoader().loadTestsFromTestCase(TestSheetSync)
+    return unittest.TestSuite([functions_suite, sync_suite])
 
 
 if __name__ == "__main__":
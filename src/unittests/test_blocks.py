@@ -0,0 +1,41 @@
+import sys
+import unittest
+
+from src.blocks import MAX_BLOCKS, MAX_SECTION_TEXT, menu_messages, split_text
+
+ITEM = "  • *Gyros* [GF]: Pita, cucumber dill sauce, lettuce, tomato."
+
+
+class TestBlocks(unittest.TestCase):
+
+    def test_split_text(self):
+        text = "\n".join([ITEM] * 200)
+        pieces = split_text(text)
+        self.assertTrue(all(len(x) <= MAX_SECTION_TEXT for x in pieces))
+        self.assertEqual("\n".join(pieces), text)
+        self.assertEqual(split_text("x" * 7, 3), ["xxx", "xxx", "x"])
+
+    def test_week_is_one_message(self):
+        days = [(f"lunch for cafe on 03/0{x}/2022", "\n".join([ITEM] * 20)) for x in range(7, 12)]
+        messages = menu_messages(days)
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(sum(x["type"] == "header" for x in messages[0]["blocks"]), 5)
+        self.assertIn("lunch for cafe on 03/07/2022", messages[0]["text"])
+
+    def test_long_menus_are_chunked(self):
+        days = [(f"lunch for cafe on 03/0{x}/2022", "\n".join([ITEM] * 1000)) for x in range(7, 12)]
+        messages = menu_messages(days)
+        self.assertGreater(len(messages), 1)
+        self.assertTrue(all(len(x["blocks"]) <= MAX_BLOCKS for x in messages))
+        sections = [y["text"]["text"] for x in messages for y in x["blocks"] if y["type"] == "section"]
+        self.assertEqual("\n".join(sections), "\n".join([ITEM] * 5000))
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestBlocks)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,44 @@
+import sys
+import time
+import unittest
+
+from src.breaker import CircuitBreaker
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+        self.assertEqual(breaker.stats()["rejected"], 1)
+
+    def test_single_trial_when_half_open(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        self.assertEqual(breaker.state, "half_open")
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+        time.sleep(0.02)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertEqual(breaker.stats()["times_opened"], 2)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestCircuitBreaker)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
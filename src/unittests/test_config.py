@@ -0,0 +1,89 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+from src.config import Config, ConfigWatcher
+
+CONFIG_TEXT = """
+tokens:
+  slack_token: xoxb-test
+cafes:
+  default:
+    company: company
+    name: {name}
+    utc_offset: 0
+guy_fieri_images: []
+guy_fieri_phrases: []
+"""
+
+
+class TestConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "config.yml")
+        self.write(CONFIG_TEXT.format(name="cafe"))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, text: str, mtime: int = 1):
+        with open(self.path, "w") as f:
+            f.write(text)
+        # a distinct modification time for every write, however quickly they follow each other
+        os.utime(self.path, ns=(mtime, mtime))
+
+    def test_read_on_first_use(self):
+        config = Config(self.path)
+        self.assertIsNone(config.mtime)
+        self.assertEqual(config["cafes"]["default"]["name"], "cafe")
+        self.assertEqual(config.mtime, 1)
+
+    def test_swap(self):
+        config = Config(self.path)
+        previous = config.swap({"cafes": {}})
+        self.assertEqual(previous, {})
+        self.assertEqual(dict(config), {"cafes": {}})
+
+    def test_reload(self):
+        config = Config(self.path)
+        watcher = ConfigWatcher(config, interval=0.01)
+        changes = []
+
+        async def listener(previous, current):
+            changes.append((previous["cafes"]["default"]["name"], current["cafes"]["default"]["name"]))
+
+        async def run():
+            watcher.listeners.append(listener)
+            watcher.start()
+            self.write(CONFIG_TEXT.format(name="renamed"), mtime=2)
+            await asyncio.sleep(0.1)
+            await watcher.stop()
+
+        self.assertEqual(config["cafes"]["default"]["name"], "cafe")
+        asyncio.run(run())
+        self.assertEqual(config["cafes"]["default"]["name"], "renamed")
+        self.assertEqual(changes, [("cafe", "renamed")])
+        self.assertEqual(watcher.stats(), {"reloads": 1, "failures": 0})
+
+    def test_invalid_config_is_ignored(self):
+        config = Config(self.path)
+        watcher = ConfigWatcher(config)
+        self.assertEqual(config["cafes"]["default"]["name"], "cafe")
+        for (mtime, text) in enumerate(("cafes: [", "cafes: {}", CONFIG_TEXT.replace("utc_offset: 0", "")), 2):
+            self.write(text, mtime)
+            self.assertFalse(asyncio.run(watcher.reload()))
+        self.assertEqual(config["cafes"]["default"]["name"], "cafe")
+        self.assertEqual(watcher.stats(), {"reloads": 0, "failures": 3})
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestConfig)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,142 @@
+import asyncio
+from datetime import date
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+from src.digest import Digester
+from src.menu_store import MenuStore
+from src.unittests.fakes import FakeCafe
+
+# a Wednesday
+TODAY = date(2022, 3, 9)
+
+
+class FakeSlack:
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.posts = []
+
+    async def post(self, channel: str, text: str, blocks):
+        if channel in self.failing:
+            raise ConnectionError(channel)
+        self.posts.append((channel, text, blocks))
+
+
+class TestDigest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "menus.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_one_fetch_for_every_channel(self):
+        cafe = FakeCafe(today=TODAY)
+        slack = FakeSlack(failing={"C3"})
+        digester = Digester({"default": cafe}, slack.post)
+
+        async def run():
+            for channel in ("C1", "C2", "C3"):
+                await digester.subscribe("default", channel)
+            return await digester.post_digest("default", cafe)
+
+        self.assertEqual(asyncio.run(run()), 2)
+        self.assertEqual(cafe.fetches, 1)
+        self.assertEqual([x for (x, _, _) in slack.posts], ["C1", "C2"])
+        self.assertIn("Gyros", slack.posts[0][2][1]["text"]["text"])
+        self.assertEqual(digester.stats()["failed"], 1)
+
+    def test_subscriptions(self):
+        async def run():
+            digester = Digester({}, FakeSlack().post, MenuStore(self.path))
+            added = [await digester.subscribe("default", "C1"), await digester.subscribe("default", "C1")]
+            await digester.subscribe("hq", "C1")
+            removed = await digester.unsubscribe(["hq", "other"], "C1")
+            await digester.store.close()
+            # subscriptions outlive the worker that made them
+            restarted = Digester({}, FakeSlack().post, MenuStore(self.path))
+            subscriptions = await restarted.subscriptions()
+            await restarted.store.close()
+            return added, removed, subscriptions
+
+        self.assertEqual(asyncio.run(run()), ([True, False], 1, {"default": {"C1"}}))
+
+    def test_one_worker_posts(self):
+        slack = FakeSlack()
+        workers = [
+            Digester({"default": FakeCafe(today=TODAY)}, slack.post, MenuStore(self.path)) for _ in range(2)
+        ]
+
+        async def run():
+            await workers[0].subscribe("default", "C1")
+            posted = await asyncio.gather(*[x.post_digest("default", x.cafes["default"]) for x in workers])
+            for digester in workers:
+                await digester.store.close()
+            return posted
+
+        self.assertEqual(sorted(asyncio.run(run())), [0, 1])
+        self.assertEqual(len(slack.posts), 1)
+
+    def test_long_menu_is_split(self):
+        items = {str(x): {"label": f"dish {x}", "description": "x" * 500, "cor_icon": []} for x in range(400)}
+        cafe = FakeCafe(items=items, today=TODAY)
+        slack = FakeSlack()
+        digester = Digester({"default": cafe}, slack.post)
+
+        async def run():
+            await digester.subscribe("default", "C1")
+            return await digester.post_digest("default", cafe)
+
+        self.assertEqual(asyncio.run(run()), 1)
+        self.assertGreater(len(slack.posts), 1)
+        self.assertTrue(all(len(x) <= 50 for (_, _, x) in slack.posts))
+
+    def test_failed_fetch_is_retried_before_taking_the_lease(self):
+        slack = FakeSlack()
+        # the first worker can't reach the café's site at all, the second only on its first attempt
+        failing = FakeCafe(failures=5, retries=0, today=TODAY)
+        flaky = FakeCafe(failures=1, retries=0, today=TODAY)
+        workers = [Digester({"default": x}, slack.post, MenuStore(self.path), backoff=0) for x in (failing, flaky)]
+
+        async def run():
+            await workers[0].subscribe("default", "C1")
+            posted = [await x.post_digest("default", x.cafes["default"]) for x in workers]
+            for digester in workers:
+                await digester.store.close()
+            return posted
+
+        self.assertEqual(asyncio.run(run()), [0, 1])
+        self.assertEqual((failing.fetches, flaky.fetches), (3, 2))
+        self.assertEqual(len(slack.posts), 1)
+
+    def test_no_digest_at_the_weekend(self):
+        cafe = FakeCafe(today=TODAY)
+        slack = FakeSlack()
+        digester = Digester({"default": cafe}, slack.post)
+
+        async def run():
+            await digester.subscribe("default", "C1")
+            with mock.patch.object(cafe, "today", return_value=date(2022, 3, 12)):
+                return await digester.post_digest("default", cafe)
+
+        self.assertEqual(asyncio.run(run()), 0)
+        self.assertEqual((cafe.fetches, slack.posts), (0, []))
+
+    def test_run_time(self):
+        digester = Digester({}, FakeSlack().post, run_time="11:00", run_times={"hq": "10:45"})
+        self.assertEqual(str(digester.run_time_for("default")), "11:00:00")
+        self.assertEqual(str(digester.run_time_for("hq")), "10:45:00")
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestDigest)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,65 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from src.events import EventDeduplicator, peek_event_id
+from src.menu_store import MenuStore
+
+
+class TestEvents(unittest.TestCase):
+
+    def test_peek_event_id(self):
+        body = json.dumps({
+            "team_id": "T1",
+            "event": {"type": "app_mention", "text": "<@U1> lunch", "channel": "C1"},
+            "type": "event_callback",
+            "event_id": "Ev123ABC",
+        }).encode()
+        self.assertEqual(peek_event_id(body), "Ev123ABC")
+        self.assertIsNone(peek_event_id(b'{"type": "url_verification"}'))
+
+    def test_first_sighting(self):
+        seen = EventDeduplicator()
+        self.assertTrue(seen.first_sighting("Ev1"))
+        self.assertFalse(seen.first_sighting("Ev1", "1"))
+        self.assertTrue(seen.first_sighting("Ev2", "1"))
+        self.assertTrue(seen.first_sighting(None))
+        self.assertEqual(seen.stats(), {"duplicates": 1, "retries": 2, "size": 2})
+
+    def test_workers_share_event_ids(self):
+        async def run(path: str):
+            store = MenuStore(path)
+            # each worker remembers its own events, and shares them through the store
+            first, second = EventDeduplicator(store=store), EventDeduplicator(store=store)
+            seen = [
+                await first.first_delivery("Ev1"),
+                # Slack's retry reaches the other worker
+                await second.first_delivery("Ev1", "1"),
+                await second.first_delivery("Ev2"),
+                await first.first_delivery("Ev2", "1"),
+            ]
+            await store.close()
+            return seen, second.stats()
+
+        with tempfile.TemporaryDirectory() as directory:
+            seen, stats = asyncio.run(run(os.path.join(directory, "menus.sqlite3")))
+        self.assertEqual(seen, [True, False, True, False])
+        self.assertEqual(stats, {"duplicates": 1, "retries": 1, "size": 2})
+
+    def test_ids_expire(self):
+        seen = EventDeduplicator(ttl=0)
+        self.assertTrue(seen.first_sighting("Ev1"))
+        self.assertTrue(seen.first_sighting("Ev1"))
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestEvents)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
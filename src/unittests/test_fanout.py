@@ -0,0 +1,51 @@
+import asyncio
+import sys
+import time
+import unittest
+
+from src.fanout import fan_out
+from src.unittests.fakes import FakeCafe
+
+
+class TestFanOut(unittest.TestCase):
+
+    def test_partial_results(self):
+        cafes = {
+            "a": FakeCafe(cafe_name="a", delay=0.05),
+            "b": FakeCafe(cafe_name="b", delay=0.05, items=None),
+            "slow": FakeCafe(cafe_name="slow", delay=1),
+            "c": FakeCafe(cafe_name="c", delay=0.05),
+        }
+        started = time.monotonic()
+        results = asyncio.run(fan_out(cafes, "2022-03-09", timeout=0.2))
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual([x.nickname for x in results], ["a", "b", "slow", "c"])
+        self.assertEqual([x.text for x in results], ["Gyros [GF]", None, None, "Gyros [GF]"])
+        self.assertEqual([x.error for x in results], [None, "no menu", "timed out", None])
+
+    def test_timed_out_cafe_is_still_cached(self):
+        slow = FakeCafe(cafe_name="slow", delay=0.3)
+
+        async def run():
+            results = await fan_out({"slow": slow}, "2022-03-09", timeout=0.1)
+            await asyncio.sleep(0.4)
+            return results
+
+        self.assertEqual(asyncio.run(run())[0].error, "timed out")
+        self.assertTrue(slow.cache.contains(slow.base_url, "2022-03-09"))
+
+    def test_cafes_are_queried_concurrently(self):
+        cafes = {str(x): FakeCafe(cafe_name=str(x), delay=0.1) for x in range(8)}
+        started = time.monotonic()
+        asyncio.run(fan_out(cafes, "2022-03-09", concurrency=8))
+        self.assertLess(time.monotonic() - started, 0.4)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestFanOut)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,157 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.breaker import CircuitBreaker, CircuitOpenError
+from src.get_menu import Cafe
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "cafe_page.html")
+
+
+class TestConditionalRequests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, "rb") as f:
+            cls.body = f.read()
+
+    def setUp(self):
+        self.requests = []
+        # whether the fake site sends validators, and the page it serves
+        self.etag = '"v1"'
+        self.page = self.body
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append(dict(request.headers))
+        if self.etag and request.headers.get("If-None-Match") == self.etag:
+            return web.Response(status=304)
+        return web.Response(body=self.page, headers={"ETag": self.etag} if self.etag else {})
+
+    async def refresh_twice(self):
+        app = web.Application()
+        app.router.add_get("/{date}", self.handle)
+        async with TestServer(app) as server:
+            cafe = Cafe("company", "cafe")
+            cafe.base_url = str(server.make_url("")).rstrip("/")
+            await cafe.initialize_session()
+            try:
+                first = await cafe.refresh("2022-03-09")
+                second = await cafe.refresh("2022-03-09")
+            finally:
+                await cafe.close_session()
+        return cafe, first, second
+
+    def test_not_modified(self):
+        cafe, first, second = asyncio.run(self.refresh_twice())
+        self.assertNotIn("If-None-Match", self.requests[0])
+        self.assertEqual(self.requests[1]["If-None-Match"], '"v1"')
+        self.assertTrue(first.changed)
+        self.assertFalse(second.changed)
+        self.assertIs(first.items, second.items)
+        self.assertEqual((cafe.fetches, cafe.not_modified, cafe.unchanged), (2, 1, 0))
+
+    def test_unchanged_without_validators(self):
+        self.etag = None
+        cafe, first, second = asyncio.run(self.refresh_twice())
+        self.assertFalse(second.changed)
+        self.assertIs(first.items, second.items)
+        self.assertEqual((cafe.fetches, cafe.not_modified, cafe.unchanged), (2, 0, 1))
+
+    def test_renders_kept_when_unchanged(self):
+        cafe, first, second = asyncio.run(self.refresh_twice())
+        self.assertIs(first.renders, second.renders)
+
+
+class TestResilience(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, "rb") as f:
+            cls.body = f.read()
+
+    def setUp(self):
+        # the statuses the fake site answers with, in turn, "hang" never answering
+        self.responses = []
+        self.requests = 0
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        response = self.responses.pop(0) if self.responses else 200
+        if response == "hang":
+            await asyncio.sleep(10)
+        return web.Response(status=response, body=self.body if response == 200 else b"")
+
+    async def run_with_cafe(self, test, **kwargs):
+        app = web.Application()
+        app.router.add_get("/{date}", self.handle)
+        async with TestServer(app) as server:
+            cafe = Cafe("company", "cafe", backoff=0.01, **kwargs)
+            cafe.base_url = str(server.make_url("")).rstrip("/")
+            await cafe.initialize_session()
+            try:
+                return await test(cafe)
+            finally:
+                await cafe.close_session()
+
+    def test_retries_server_errors(self):
+        self.responses = [503, 502]
+        entry = asyncio.run(self.run_with_cafe(lambda cafe: cafe.refresh("2022-03-09")))
+        self.assertEqual(self.requests, 3)
+        self.assertTrue(len(entry.items))
+
+    def test_no_retry_for_missing_menu(self):
+        self.responses = [404]
+
+        async def test(cafe):
+            with self.assertRaises(LookupError):
+                await cafe.refresh("2022-03-09")
+
+        asyncio.run(self.run_with_cafe(test))
+        self.assertEqual(self.requests, 1)
+
+    def test_deadline(self):
+        self.responses = ["hang"]
+
+        async def test(cafe):
+            started = time.monotonic()
+            with self.assertRaises(asyncio.TimeoutError):
+                await cafe.refresh("2022-03-09")
+            self.assertLess(time.monotonic() - started, 1)
+
+        asyncio.run(self.run_with_cafe(test, deadline=0.2))
+
+    def test_open_breaker_serves_last_known_menu(self):
+        async def test(cafe):
+            fresh = await cafe.refresh("2022-03-09")
+            self.responses = [500] * 3
+            with self.assertRaises(Exception):
+                await cafe.refresh("2022-03-09")
+            self.assertEqual(cafe.breaker.state, "open")
+            with self.assertRaises(CircuitOpenError):
+                await cafe.refresh("2022-03-09")
+            cafe.cache = type(cafe.cache)()
+            text = await cafe.menu_items("2022-03-09")
+            entry = cafe.cache.get(cafe.base_url, "2022-03-09")
+            self.assertTrue(entry.stale)
+            self.assertEqual(text, fresh.render())
+            self.assertEqual(cafe.stats()["stale_served"], 1)
+
+        asyncio.run(self.run_with_cafe(test, retries=2, breaker=CircuitBreaker(failure_threshold=1)))
+        # the open breaker stopped any more requests being made
+        self.assertEqual(self.requests, 4)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestConditionalRequests)
+    resilience_suite = unittest.TestLoader().loadTestsFromTestCase(TestResilience)
+    return unittest.TestSuite([functions_suite, resilience_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
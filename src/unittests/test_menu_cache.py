@@ -0,0 +1,64 @@
+import asyncio
+from datetime import date
+import sys
+import unittest
+
+from src.menu_model import DailyMenu
+from src.menu_cache import MenuCache
+from src.unittests.fakes import FakeCafe
+
+
+class TestMenuCache(unittest.TestCase):
+
+    def test_ttl_for(self):
+        cache = MenuCache(past_ttl=100, today_ttl=10, future_ttl=50)
+        today = date(2022, 3, 9)
+        self.assertEqual(cache.ttl_for("2022-03-08", today), 100)
+        self.assertEqual(cache.ttl_for("2022-03-09", today), 10)
+        self.assertEqual(cache.ttl_for("2022-03-10", today), 50)
+
+    def test_lru_eviction(self):
+        cache = MenuCache(maxsize=2)
+        today = date(2022, 3, 9)
+        for day in ("2022-03-07", "2022-03-08", "2022-03-09"):
+            cache.put("cafe", day, DailyMenu(), today)
+        self.assertIsNone(cache.get("cafe", "2022-03-07"))
+        self.assertEqual(len(cache), 2)
+        self.assertIsNotNone(cache.get("cafe", "2022-03-09"))
+
+    def test_drop(self):
+        cache = MenuCache()
+        today = date(2022, 3, 9)
+        for cafe in ("cafe", "other"):
+            cache.put(cafe, "2022-03-09", DailyMenu(), today)
+            cache.put_missing(cafe, "2022-03-10")
+        self.assertEqual(cache.drop("cafe"), 2)
+        self.assertFalse(cache.contains("cafe", "2022-03-09"))
+        self.assertTrue(cache.contains("other", "2022-03-09"))
+
+    def test_warm_request_does_not_fetch(self):
+        cafe = FakeCafe()
+        first = asyncio.run(cafe.menu_items("2022-03-09"))
+        second = asyncio.run(cafe.menu_items("2022-03-09"))
+        self.assertEqual(first, second)
+        self.assertEqual(cafe.fetches, 1)
+        self.assertEqual(cafe.cache.stats()["hits"], 1)
+        self.assertEqual(cafe.cache.stats()["misses"], 1)
+
+    def test_negative_caching(self):
+        cafe = FakeCafe(items=None)
+        for _ in range(2):
+            with self.assertRaises(LookupError):
+                asyncio.run(cafe.menu_items("2022-03-09"))
+        self.assertEqual(cafe.fetches, 1)
+        self.assertEqual(cafe.cache.stats()["negative_hits"], 1)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestMenuCache)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
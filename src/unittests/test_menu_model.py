@@ -0,0 +1,48 @@
+import os
+import sys
+import unittest
+
+from src.bamco import extract_bytes
+from src.menu_model import DailyMenu, MenuItem
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "cafe_page.html")
+
+
+class TestMenuModel(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, "rb") as f:
+            cls.menu_items = extract_bytes(f.read()).menu_items
+
+    def test_from_bamco(self):
+        item = MenuItem.from_bamco({
+            "label": "gyros",
+            "description": "pita, cucumber dill sauce",
+            "station": "<strong>@grill</strong>",
+            "cor_icon": {"1": "Vegetarian", "9": "Gluten Free"},
+            "nutrition": {"kcal": "640"},
+        })
+        self.assertEqual(item.to_row(), ["gyros", "pita, cucumber dill sauce", "@grill", ["1", "9"]])
+        self.assertEqual(MenuItem.from_bamco({"label": "rice", "description": "", "cor_icon": []}).cor_icons, ())
+
+    def test_repeated_strings_are_shared(self):
+        menu = DailyMenu.from_bamco(self.menu_items)
+        grill = [x.station for x in menu if x.station == "@grill"]
+        self.assertGreater(len(grill), 1)
+        self.assertTrue(all(x is grill[0] for x in grill))
+
+    def test_bytes_round_trip(self):
+        menu = DailyMenu.from_bamco(self.menu_items)
+        self.assertEqual(len(menu), len(self.menu_items))
+        self.assertEqual(DailyMenu.from_bytes(menu.to_bytes()), menu)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestMenuModel)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
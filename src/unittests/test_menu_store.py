@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+from src.get_menu import Cafe
+from src.menu_cache import MenuCache
+from src.menu_model import DailyMenu
+from src.menu_store import MenuStore, pack, unpack
+from src.unittests.fakes import ITEMS, FakeCafe
+
+# seconds each fetch takes, slow enough for the other worker to find the lease taken
+DELAY = 0.1
+
+
+class TestMenuStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "menus.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_pack(self):
+        menu = DailyMenu.from_bamco(ITEMS)
+        self.assertEqual(unpack(pack(menu)), menu)
+
+    def test_restart_is_served_from_the_store(self):
+        date_ = "2022-03-07"
+
+        async def run(cafe: Cafe):
+            text = await cafe.menu_items(date_)
+            await cafe.store.close()
+            return text
+
+        before = FakeCafe(delay=DELAY, store=MenuStore(self.path))
+        after = FakeCafe(delay=DELAY, store=MenuStore(self.path))
+        self.assertEqual(asyncio.run(run(before)), asyncio.run(run(after)))
+        self.assertEqual((before.fetches, after.fetches), (1, 0))
+
+    def test_menus_stored_to_be_kept_longer_stay_fresh(self):
+        date_ = FakeCafe().today().strftime("%Y-%m-%d")
+
+        async def run(fresh_for):
+            store = MenuStore(self.path)
+            store.put("company", "cafe", date_, DailyMenu.from_bamco(ITEMS), fresh_for)
+            # today's menu would usually be refetched straight away
+            cafe = FakeCafe(delay=DELAY, cache=MenuCache(today_ttl=0), store=store)
+            await cafe.menu_items(date_)
+            await store.close()
+            return cafe.fetches
+
+        self.assertEqual((asyncio.run(run(60 * 60)), asyncio.run(run(None))), (0, 1))
+
+    def test_lease(self):
+        async def run():
+            first, second = MenuStore(self.path), MenuStore(self.path)
+            taken = [
+                await first.acquire("company", "cafe", "2022-03-07", 10),
+                await second.acquire("company", "cafe", "2022-03-07", 10),
+                await second.leased("company", "cafe", "2022-03-07"),
+            ]
+            # a lease left by a worker that died expires
+            await first.acquire("company", "cafe", "2022-03-08", -1)
+            taken.append(await second.acquire("company", "cafe", "2022-03-08", 10))
+            first.release("company", "cafe", "2022-03-07")
+            await first.close()
+            taken.append(await second.leased("company", "cafe", "2022-03-07"))
+            await second.close()
+            return taken
+
+        self.assertEqual(asyncio.run(run()), [True, False, True, True, False])
+
+    def test_expired_leases_are_deleted(self):
+        async def run():
+            store = MenuStore(self.path)
+            await store.acquire("company", "cafe", "2022-03-07", -1)
+            # leases are only swept now and then
+            store._next_sweep = 0
+            await store.acquire("company", "cafe", "2022-03-08", 10)
+            await store.close()
+            return store._connect().execute("SELECT date FROM leases").fetchall()
+
+        self.assertEqual(asyncio.run(run()), [("2022-03-08",)])
+
+    def test_workers_share_fetches(self):
+        date_ = "2022-03-07"
+        # each worker has its own cache and in-flight fetches, but they share the menu store
+        workers = [FakeCafe(delay=DELAY, store=MenuStore(self.path)) for _ in range(2)]
+
+        async def run():
+            texts = await asyncio.gather(*[x.menu_items(date_) for x in workers])
+            for cafe in workers:
+                await cafe.store.close()
+            return texts
+
+        first, second = asyncio.run(run())
+        self.assertEqual(first, second)
+        self.assertEqual(sorted(x.fetches for x in workers), [0, 1])
+        self.assertEqual(sorted(x.fetched_elsewhere for x in workers), [0, 1])
+
+    def test_workers_share_missing_menus(self):
+        date_ = "2022-03-07"
+        workers = [FakeCafe(items=None, delay=DELAY, store=MenuStore(self.path)) for _ in range(3)]
+
+        async def run():
+            results = await asyncio.gather(*[x.menu_items(date_) for x in workers[:2]], return_exceptions=True)
+            # a worker asking soon after finds the menu missing from the store, without fetching it either
+            results.append(*await asyncio.gather(workers[2].menu_items(date_), return_exceptions=True))
+            for cafe in workers:
+                await cafe.store.close()
+            return results
+
+        self.assertTrue(all(isinstance(x, LookupError) for x in asyncio.run(run())))
+        self.assertEqual(sorted(x.fetches for x in workers), [0, 0, 1])
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestMenuStore)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,72 @@
+import asyncio
+import sys
+import unittest
+
+from src.metrics import Registry
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter("mentions_total", "Mentions", ("action",))
+        counter.labels("lunch").inc()
+        counter.labels("lunch").inc(2)
+        counter.labels("help").inc()
+        self.assertEqual(self.registry.render(), "\n".join([
+            "# HELP mentions_total Mentions",
+            "# TYPE mentions_total counter",
+            'mentions_total{action="lunch"} 3',
+            'mentions_total{action="help"} 1',
+        ]) + "\n")
+
+    def test_histogram(self):
+        histogram = self.registry.histogram("fetch_seconds", "Fetches", buckets=(0.1, 1))
+        for value in (0.05, 0.1, 0.5, 2):
+            histogram.observe(value)
+        self.assertEqual(self.registry.render().splitlines()[2:], [
+            'fetch_seconds_bucket{le="0.1"} 2',
+            'fetch_seconds_bucket{le="1"} 3',
+            'fetch_seconds_bucket{le="+Inf"} 4',
+            "fetch_seconds_sum 2.65",
+            "fetch_seconds_count 4",
+        ])
+
+    def test_sampling(self):
+        histogram = self.registry.histogram("render_seconds", "Renders")
+        self.registry.configure(sample_every=4)
+        for _ in range(10):
+            histogram.observe(0.001)
+        self.assertEqual(histogram.labels().count, 2)
+
+    def test_time(self):
+        histogram = self.registry.histogram("job_seconds", "Jobs", ("job",))
+        sleeps = histogram.labels("sleep")
+
+        @sleeps.time
+        async def job():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        self.assertEqual(asyncio.run(job()), "done")
+        self.assertEqual(histogram.labels("sleep").count, 1)
+        self.assertGreaterEqual(histogram.labels("sleep").sum, 0.01)
+
+    def test_collector(self):
+        values = {("hq",): 1, ("west",): 0}
+        self.registry.collect("breaker_open", "Open breakers", "gauge", lambda: values, ("cafe",))
+        self.assertIn('breaker_open{cafe="hq"} 1', self.registry.render())
+        with self.assertRaises(ValueError):
+            self.registry.counter("breaker_open", "Again")
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestMetrics)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
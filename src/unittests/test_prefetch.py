@@ -0,0 +1,79 @@
+import asyncio
+from datetime import date, datetime, time, timezone
+import sys
+import time as clock
+from types import SimpleNamespace
+import unittest
+from unittest import mock
+
+from src.menu_cache import MenuCache
+from src.prefetch import Prefetcher, seconds_until, week_dates
+from src.unittests.fakes import FakeCafe
+
+
+class TestPrefetch(unittest.TestCase):
+
+    def test_week_dates(self):
+        self.assertEqual(week_dates(date(2022, 3, 9))[0], date(2022, 3, 7))
+        self.assertEqual(week_dates(date(2022, 3, 12)), [date(2022, 3, x) for x in range(14, 19)])
+
+    def test_seconds_until(self):
+        now = datetime(2022, 3, 9, 16, 0, tzinfo=timezone.utc)
+        # 08:00 local, so the next run is at 10:30 the same day
+        self.assertEqual(seconds_until([time(0, 15), time(10, 30)], -8, now), 2.5 * 60 * 60)
+        # 17:00 local, so the next run is 00:15 the next day
+        self.assertEqual(seconds_until([time(0, 15), time(10, 30)], 1, now), 7.25 * 60 * 60)
+
+    def test_prefetch_warms_the_cache(self):
+        cafe = FakeCafe()
+        asyncio.run(Prefetcher({"default": cafe}).prefetch(cafe))
+        self.assertEqual(cafe.fetches, 5)
+        for date_ in week_dates(cafe.today()):
+            self.assertTrue(cafe.cache.contains(cafe.base_url, date_.strftime("%Y-%m-%d")))
+
+    def test_prefetched_menus_last_until_the_next_run(self):
+        elapsed = [0.0]
+        with mock.patch("src.menu_cache.time", SimpleNamespace(
+                monotonic=lambda: elapsed[0], perf_counter=clock.perf_counter)):
+            cafe = FakeCafe(cache=MenuCache())
+        # prefetched at 10:30, before the lunch rush
+        asyncio.run(Prefetcher({"default": cafe}).prefetch(cafe, datetime(2022, 3, 9, 10, 30, tzinfo=timezone.utc)))
+        # and still served at noon, well after Friday's menu (whether today's or a future day's) would usually have
+        # expired
+        elapsed[0] = 1.5 * 60 * 60
+        friday = week_dates(cafe.today())[-1].strftime("%Y-%m-%d")
+        self.assertIn("Gyros", asyncio.run(cafe.menu_items(friday)))
+        self.assertEqual(cafe.fetches, 5)
+        # but not past the next run, after midnight
+        elapsed[0] = 14.5 * 60 * 60
+        self.assertFalse(cafe.cache.contains(cafe.base_url, friday))
+
+    def test_sync(self):
+        kept, removed, replaced = FakeCafe(cafe_name="kept"), FakeCafe(cafe_name="removed"), FakeCafe(cafe_name="a")
+        cafes = {"kept": kept, "removed": removed, "replaced": replaced}
+
+        async def run():
+            prefetcher = Prefetcher(cafes, jitter=0)
+            prefetcher.start()
+            tasks = {x: y for (x, (_, y)) in prefetcher._tasks.items()}
+            del cafes["removed"]
+            cafes["replaced"] = FakeCafe(cafe_name="b")
+            cafes["added"] = FakeCafe(cafe_name="added")
+            await prefetcher.sync()
+            running = {x: y for (x, (y, _)) in prefetcher._tasks.items()}
+            await prefetcher.stop()
+            return tasks, running
+
+        tasks, running = asyncio.run(run())
+        self.assertEqual(running, cafes)
+        self.assertTrue(tasks["removed"].cancelled() and tasks["replaced"].cancelled())
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestPrefetch)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
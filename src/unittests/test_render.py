@@ -0,0 +1,51 @@
+from datetime import date
+import sys
+import unittest
+
+from src.menu_cache import MenuCache
+from src.menu_model import DailyMenu, MenuItem
+from src.render import render
+
+MENU = DailyMenu([
+    MenuItem("beet salad", "goat cheese, walnuts", "@salad bar", ("1", "9")),
+    MenuItem("brown rice", "steamed", "@entrées", ("4", "9")),
+    MenuItem("gyros", "pita, cucumber dill sauce", "@grill", ()),
+])
+MENU_DATE = date(2022, 3, 9)
+
+
+class TestRender(unittest.TestCase):
+
+    def test_text(self):
+        self.assertEqual(render(MENU), "\n".join([
+            "  • *Beet Salad* [V][GF]: Goat cheese, walnuts.",
+            "  • *Brown Rice* [Ve][GF]: Steamed.",
+            "  • *Gyros* : Pita, cucumber dill sauce.",
+        ]))
+
+    def test_dietary_filters(self):
+        self.assertEqual(render(MENU, "compact", "vegan"), "Brown Rice [Ve][GF]")
+        self.assertEqual(render(MENU, "compact", "vegetarian"), "Beet Salad [V][GF], Brown Rice [Ve][GF]")
+        self.assertEqual(render(MENU, "compact", "gluten-free"), "Beet Salad [V][GF], Brown Rice [Ve][GF]")
+        self.assertEqual(render(DailyMenu(), dietary="vegan"), "No vegan items on the menu.")
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            render(MENU, "html")
+
+    def test_renders_are_cached_per_entry(self):
+        cache = MenuCache()
+        entry = cache.put("cafe", "2022-03-09", MENU, MENU_DATE)
+        self.assertIs(entry.render(dietary="vegan"), entry.render(dietary="vegan"))
+        refreshed = cache.put("cafe", "2022-03-09", DailyMenu(MENU.items[:1]), MENU_DATE)
+        self.assertEqual(refreshed.render(dietary="vegan"), "No vegan items on the menu.")
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestRender)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,90 @@
+from datetime import date, datetime, timezone
+import sys
+import unittest
+
+from src.router import day_table, Router
+
+CAFES = {
+    "default": {"company": "company", "name": "cafe", "utc_offset": 0},
+    "hq": {"company": "company", "name": "hq-cafe", "utc_offset": -8},
+}
+# a Wednesday, 08:00 UTC (midnight in HQ)
+NOW = datetime(2022, 3, 9, 8, 0, tzinfo=timezone.utc)
+
+
+class TestRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = Router(CAFES)
+
+    def test_cafe(self):
+        self.assertEqual(self.router.parse("<@U123> hq lunch friday", NOW).cafe, "hq")
+        self.assertEqual(self.router.parse("<@U123> HQ lunch friday", NOW).cafe, "hq")
+        # nicknames only match whole words
+        self.assertEqual(self.router.parse("<@U123> lunch at the hqs friday", NOW).cafe, "default")
+
+    def test_dates(self):
+        self.assertEqual(self.router.parse("<@U123> lunch", NOW).dates, (date(2022, 3, 9),))
+        self.assertEqual(self.router.parse("<@U123> hq lunch", NOW).dates, (date(2022, 3, 9),))
+        self.assertEqual(self.router.parse("<@U123> lunch all", NOW).dates, (date(2022, 3, 9),))
+        self.assertEqual(self.router.parse("<@U123> lunch vegan, hq", NOW).dates, (date(2022, 3, 9),))
+        self.assertIsNone(self.router.parse("<@U123> lunch at hq", NOW).dates)
+        self.assertEqual(self.router.parse("<@U123> lunch tomorrow", NOW).dates, (date(2022, 3, 10),))
+        self.assertEqual(self.router.parse("<@U123> lunch friday", NOW).dates, (date(2022, 3, 11),))
+        self.assertEqual(len(self.router.parse("<@U123> lunch this week", NOW).dates), 5)
+        # a relative day takes priority over a week day
+        self.assertEqual(self.router.parse("<@U123> friday lunch today", NOW).dates, (date(2022, 3, 9),))
+        self.assertIsNone(self.router.parse("<@U123> lunch someday please", NOW).dates)
+
+    def test_action_and_meal(self):
+        command = self.router.parse("<@U123> help", NOW)
+        self.assertEqual((command.action, command.meal), ("help", None))
+        self.assertEqual(self.router.parse("<@U123> Lunch?", NOW).meal, "lunch")
+
+    def test_dietary(self):
+        self.assertEqual(self.router.parse("<@U123> lunch vegan friday", NOW).dietary, "vegan")
+        self.assertEqual(self.router.parse("<@U123> gluten-free lunch", NOW).dietary, "gluten-free")
+        self.assertIsNone(self.router.parse("<@U123> lunch friday", NOW).dietary)
+
+    def test_fan_out(self):
+        command = self.router.parse("<@U123> lunch all", NOW)
+        self.assertEqual((command.fan_out, command.dates), (("default", "hq"), (date(2022, 3, 9),)))
+        self.assertEqual(Router(CAFES, {"west": ["hq"]}).parse("<@U123> west lunch", NOW).fan_out, ("hq",))
+        self.assertIsNone(self.router.parse("<@U123> hq lunch", NOW).fan_out)
+
+    def test_search_query(self):
+        command = self.router.parse("<@U123> where is ramen this week", NOW)
+        self.assertEqual((command.action, command.query, len(command.dates)), ("where", "ramen", 5))
+        command = self.router.parse("<@U123> when is vegan gyros at hq?", NOW)
+        self.assertEqual((command.action, command.query, command.dietary), ("when", "gyro", "vegan"))
+        self.assertIsNone(self.router.parse("<@U123> help", NOW).query)
+        self.assertTrue(command.is_search)
+        self.assertTrue(self.router.parse("<@U123> where", NOW).is_search)
+
+    def test_meal_questions(self):
+        command = self.router.parse("<@U123> where is lunch today?", NOW)
+        self.assertEqual((command.action, command.query, command.meal), ("where", "", "lunch"))
+        self.assertFalse(command.is_search)
+        command = self.router.parse("<@U123> when is lunch tomorrow", NOW)
+        self.assertEqual((command.action, command.query, command.dates), ("when", "", (date(2022, 3, 10),)))
+        self.assertFalse(command.is_search)
+
+    def test_subscription(self):
+        command = self.router.parse("<@U123> subscribe hq", NOW)
+        self.assertEqual((command.action, command.cafe), ("subscribe", "hq"))
+        command = self.router.parse("<@U123> unsubscribe all", NOW)
+        self.assertEqual((command.action, command.fan_out), ("unsubscribe", ("default", "hq")))
+
+    def test_day_table_weekend(self):
+        self.assertEqual(day_table(date(2022, 3, 12))["MONDAY"], (date(2022, 3, 14),))
+        self.assertEqual(day_table(date(2022, 3, 12))["TODAY"], (date(2022, 3, 12),))
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestRouter)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,75 @@
+from datetime import date
+import sys
+import unittest
+
+from src.menu_cache import MenuCache
+from src.menu_model import DailyMenu, MenuItem
+from src.search import MenuIndex, tokenize
+
+MONDAY = DailyMenu([
+    MenuItem("chicken gyros", "pita, cucumber dill sauce", "@grill", ()),
+    MenuItem("tofu ramen", "miso broth, scallions", "@noodles", ("4",)),
+])
+TUESDAY = DailyMenu([
+    MenuItem("shoyu ramen", "pork belly, soft egg", "@noodles", ()),
+])
+
+
+class TestMenuIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = MenuIndex({"https://hq.cafebonappetit.com/": "hq"})
+        self.index.update("https://hq.cafebonappetit.com/", "2022-03-07", MONDAY)
+        self.index.update("https://west.cafebonappetit.com/", "2022-03-08", TUESDAY)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize("Where are the Gyros?"), ["where", "gyro"])
+        self.assertEqual(tokenize("Crème Brûlée"), ["creme", "brulee"])
+        self.assertEqual(tokenize("swiss cheese"), ["swiss", "cheese"])
+
+    def test_search(self):
+        hits = self.index.search("ramen")
+        self.assertEqual([(x.cafe, x.date) for x in hits], [
+            ("hq", "2022-03-07"), ("https://west.cafebonappetit.com/", "2022-03-08")
+        ])
+        self.assertEqual([x.item.label for x in self.index.search("Gyro")], ["chicken gyros"])
+        # every word must match, in the label or description
+        self.assertEqual([x.item.label for x in self.index.search("ramen egg")], ["shoyu ramen"])
+        self.assertEqual(self.index.search("ramen pizza"), [])
+        self.assertEqual(self.index.search("the"), [])
+
+    def test_filters(self):
+        self.assertEqual([x.date for x in self.index.search("ramen", start="2022-03-08")], ["2022-03-08"])
+        self.assertEqual([x.date for x in self.index.search("ramen", end="2022-03-07")], ["2022-03-07"])
+        self.assertEqual([x.item.label for x in self.index.search("ramen", cor_icons={"4"})], ["tofu ramen"])
+        self.assertEqual([x.date for x in self.index.next("ramen", "2022-03-08")], ["2022-03-08"])
+        self.assertEqual(self.index.next("gyro", "2022-03-08"), [])
+
+    def test_update_replaces_day(self):
+        self.index.update("https://hq.cafebonappetit.com/", "2022-03-07", TUESDAY)
+        self.assertEqual(self.index.search("gyro"), [])
+        self.assertEqual(len(self.index.search("shoyu")), 2)
+
+    def test_oldest_days_dropped(self):
+        index = MenuIndex(max_days=1)
+        index.update("cafe", "2022-03-07", MONDAY)
+        index.update("cafe", "2022-03-08", TUESDAY)
+        self.assertEqual(len(index), 1)
+        self.assertEqual([x.date for x in index.search("ramen")], ["2022-03-08"])
+
+    def test_cache_listener(self):
+        cache = MenuCache()
+        index = MenuIndex()
+        cache.listeners.append(index.update)
+        cache.put("cafe", "2022-03-07", MONDAY, date(2022, 3, 7))
+        self.assertEqual(len(index.search("gyro")), 1)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestMenuIndex)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import unittest
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.get_menu import Cafe
+from src.session import SessionPool
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "cafe_page.html")
+
+
+class TestSessionPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(FIXTURE, "rb") as f:
+            cls.body = f.read()
+
+    def setUp(self):
+        self.requests = []
+
+    async def handle(self, request: web.Request) -> web.Response:
+        self.requests.append((request.match_info["cafe"], dict(request.headers)))
+        return web.Response(body=self.body)
+
+    def test_cafes_share_the_pool(self):
+        async def run():
+            app = web.Application()
+            app.router.add_get("/{cafe}/{date}", self.handle)
+            async with TestServer(app) as server:
+                pool = SessionPool()
+                session = await pool.open()
+                cafes = [Cafe("company", x, base_url=str(server.make_url(f"/{x}"))) for x in ("hq", "west")]
+                for cafe in cafes:
+                    await cafe.initialize_session(session)
+                # one after the other, so the second can reuse the first's connection
+                for cafe in cafes:
+                    await cafe.get_menu_items("2022-03-09")
+                await cafe.get_menu_items("2022-03-10")
+                shared = [x.req is session and x.req.connector is session.connector for x in cafes]
+                for cafe in cafes:
+                    await cafe.close_session()
+                # a café doesn't close the session it was given
+                still_open = not session.closed
+                stats = pool.stats()
+                await pool.close()
+                reopened = await pool.open()
+                rebuilt = (session.closed, reopened is not session, reopened.closed)
+                await pool.close()
+                return shared, still_open, stats, rebuilt
+
+        shared, still_open, stats, rebuilt = asyncio.run(run())
+        self.assertEqual(shared, [True, True])
+        self.assertTrue(still_open)
+        self.assertEqual([x for (x, _) in self.requests], ["hq", "west", "west"])
+        self.assertEqual(self.requests[0][1]["Accept-Encoding"], "gzip, deflate")
+        self.assertEqual(
+            (stats["requests"], stats["connections_created"], stats["connections_reused"]), (3, 1, 2)
+        )
+        self.assertEqual((stats["limit"], stats["limit_per_host"]), (100, 8))
+        self.assertEqual(rebuilt, (True, True, False))
+
+    def test_compression_can_be_turned_off(self):
+        async def run():
+            app = web.Application()
+            app.router.add_get("/{cafe}/{date}", self.handle)
+            async with TestServer(app) as server:
+                pool = SessionPool(compress=False)
+                session = await pool.open()
+                async with session.get(server.make_url("/hq/2022-03-09")) as r:
+                    await r.read()
+                await pool.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.requests[0][1]["Accept-Encoding"], "identity")
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestSessionPool)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,62 @@
+import asyncio
+import sys
+import unittest
+
+from src.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+
+    def test_concurrent_calls_share_one_result(self):
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "menu"
+
+        async def run():
+            flights = SingleFlight()
+            return await asyncio.gather(*[flights.do(("cafe", "2022-03-09"), work) for _ in range(10)])
+
+        self.assertEqual(asyncio.run(run()), ["menu"] * 10)
+        self.assertEqual(len(calls), 1)
+
+    def test_errors_reach_every_caller(self):
+        async def work():
+            await asyncio.sleep(0.01)
+            raise LookupError
+
+        async def run():
+            flights = SingleFlight()
+            results = await asyncio.gather(*[flights.do("key", work) for _ in range(3)], return_exceptions=True)
+            return results, flights.in_flight()
+
+        results, in_flight = asyncio.run(run())
+        self.assertTrue(all(isinstance(x, LookupError) for x in results))
+        self.assertEqual(in_flight, 0)
+
+    def test_cancelled_caller_does_not_cancel_others(self):
+        async def work():
+            await asyncio.sleep(0.02)
+            return "menu"
+
+        async def run():
+            flights = SingleFlight()
+            first = asyncio.create_task(flights.do("key", work))
+            second = asyncio.create_task(flights.do("key", work))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second, first.cancelled()
+
+        self.assertEqual(asyncio.run(run()), ("menu", True))
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestSingleFlight)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,109 @@
+import asyncio
+import sys
+import unittest
+
+from slack_sdk.errors import SlackApiError
+
+from src.slack_queue import CALL_SECONDS, SlackPoster, TokenBucket
+
+
+class FakeResponse(dict):
+    def __init__(self, status_code: int, headers: dict):
+        super().__init__(ok=status_code == 200)
+        self.status_code = status_code
+        self.headers = headers
+
+
+class FakeClient:
+    def __init__(self, rate_limited: int = 0):
+        self.rate_limited = rate_limited
+        self.posted = []
+
+    async def chat_postMessage(self, **kwargs):
+        if self.rate_limited:
+            self.rate_limited -= 1
+            raise SlackApiError("ratelimited", FakeResponse(429, {"Retry-After": "0.01"}))
+        self.posted.append(kwargs["text"])
+        return FakeResponse(200, {})
+
+
+class TestSlackPoster(unittest.TestCase):
+
+    def test_token_bucket(self):
+        bucket = TokenBucket(10, 2)
+        waits = []
+        for _ in range(3):
+            waits.append(bucket.wait() > 0)
+            bucket.take()
+        self.assertEqual(waits, [False, False, True])
+
+    def test_rate_limited_posts_are_retried(self):
+        async def run():
+            poster = SlackPoster(client, workers=1)
+            poster.start()
+            response = await poster.post_message(channel="C1", text="lunch")
+            await poster.stop()
+            return response, poster.stats()
+
+        client = FakeClient(rate_limited=2)
+        calls = CALL_SECONDS.labels("chat_postMessage").count
+        response, stats = asyncio.run(run())
+        self.assertTrue(response["ok"])
+        self.assertEqual(client.posted, ["lunch"])
+        self.assertEqual((stats["sent"], stats["rate_limited"]), (1, 2))
+        # the rate limited calls are timed too
+        self.assertEqual(CALL_SECONDS.labels("chat_postMessage").count - calls, 3)
+
+    def test_gives_up_after_max_retries(self):
+        async def run():
+            poster = SlackPoster(FakeClient(rate_limited=5), workers=1, max_retries=2)
+            poster.start()
+            try:
+                await poster.post_message(channel="C1", text="lunch")
+            finally:
+                await poster.stop()
+
+        with self.assertRaises(SlackApiError):
+            asyncio.run(run())
+
+    def test_busy_channel_does_not_hold_up_others(self):
+        async def run():
+            poster = SlackPoster(client, workers=1)
+            poster.start()
+            # C1 has used its burst, so its next post waits about a second for a token
+            busy = [asyncio.create_task(poster.post_message(channel="C1", text=f"busy {x}")) for x in range(4)]
+            await asyncio.sleep(0.01)
+            await asyncio.wait_for(poster.post_message(channel="C2", text="quiet"), 0.5)
+            for task in busy:
+                task.cancel()
+            await poster.stop()
+
+        client = FakeClient()
+        asyncio.run(run())
+        self.assertEqual(client.posted, ["busy 0", "busy 1", "busy 2", "quiet"])
+
+    def test_replies_go_first(self):
+        async def run():
+            poster = SlackPoster(client, workers=1)
+            posts = [
+                asyncio.create_task(poster.post_message(channel=f"C{x}", text=f"message {x}")) for x in range(3)
+            ]
+            posts.append(asyncio.create_task(poster.post_message(channel="C9", text="reply", thread_ts="1.0")))
+            await asyncio.sleep(0)
+            poster.start()
+            await asyncio.gather(*posts)
+            await poster.stop()
+
+        client = FakeClient()
+        asyncio.run(run())
+        self.assertEqual(client.posted, ["reply", "message 0", "message 1", "message 2"])
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestSlackPoster)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)
@@ -0,0 +1,65 @@
+import asyncio
+import sys
+import unittest
+
+from src.supervisor import TaskSupervisor
+
+
+class TestTaskSupervisor(unittest.TestCase):
+
+    def test_channels_take_turns(self):
+        order = []
+
+        def job(channel: str):
+            async def run():
+                order.append(channel)
+            return run
+
+        async def run():
+            supervisor = TaskSupervisor(workers=1)
+            supervisor.start()
+            for _ in range(3):
+                supervisor.submit("busy", job("busy"))
+            supervisor.submit("quiet", job("quiet"))
+            await supervisor.drain()
+
+        asyncio.run(run())
+        self.assertEqual(order, ["busy", "quiet", "busy", "busy"])
+
+    def test_sheds_load_when_saturated(self):
+        async def job():
+            await asyncio.sleep(0.01)
+
+        async def run():
+            supervisor = TaskSupervisor(workers=1, max_queue=3, max_per_channel=2)
+            supervisor.start()
+            accepted = [supervisor.submit(x, job) for x in ("a", "a", "a", "b", "c")]
+            await supervisor.drain()
+            return accepted, supervisor.stats()
+
+        accepted, stats = asyncio.run(run())
+        self.assertEqual(accepted, [True, True, False, True, False])
+        self.assertEqual((stats["completed"], stats["rejected"]), (3, 2))
+
+    def test_failures_are_counted(self):
+        async def job():
+            raise ValueError
+
+        async def run():
+            supervisor = TaskSupervisor()
+            supervisor.start()
+            supervisor.submit("a", job)
+            await supervisor.drain()
+            return supervisor.stats()
+
+        self.assertEqual(asyncio.run(run())["failed"], 1)
+
+
+def suite():
+    functions_suite = unittest.TestLoader().loadTestsFromTestCase(TestTaskSupervisor)
+    return unittest.TestSuite([functions_suite])
+
+
+if __name__ == "__main__":
+    text_test_result = unittest.TextTestRunner(verbosity=1).run(suite())
+    sys.exit(0 if text_test_result.wasSuccessful() else 1)